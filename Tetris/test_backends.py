@@ -0,0 +1,51 @@
+import random
+import unittest
+import tetris_ai as ai
+import tetris_engine as engine
+import tetris_gameboard as gameboard
+import tetris_bitboard as bitboard
+
+
+class BackendsTest(unittest.TestCase):
+    """
+    Gameboard and Bitboard games from the same seed and moves.
+    """
+
+    def check(self, games):
+        gameboard_game, bitboard_game = games
+        self.assertEqual(gameboard_game.board.row_masks(),
+                         bitboard_game.board.row_masks())
+        self.assertEqual(gameboard_game.board.board,
+                         bitboard_game.board.board)
+        for name in ('score', 'lines', 'level', 'game_over'):
+            self.assertEqual(getattr(gameboard_game, name),
+                             getattr(bitboard_game, name))
+        self.assertEqual(gameboard_game.zobrist(), bitboard_game.zobrist())
+
+    def play(self, seed, choose, variant=engine.STANDARD, steps=1500):
+        games = [engine.Engine(board_class, seed, variant)
+                 for board_class in (gameboard.Gameboard, bitboard.Bitboard)]
+        for step in range(steps):
+            if games[0].game_over:
+                break
+            action = choose(games[0])
+            for tetris in games:
+                tetris.tick([action])
+            self.check(games)
+        return games[0]
+
+    def test_random_moves(self):
+        for seed in range(20):
+            rng = random.Random(seed)
+            self.play(seed, lambda tetris: rng.choice(engine.ACTIONS))
+
+    def test_planned_moves(self):
+        # Planned play clears lines, so scoring and clears are compared.
+        for variant in (engine.STANDARD, engine.VARIANTS['pentominos']):
+            planner = ai.Planner(lookahead=1, beam=4)
+            tetris = self.play(1, planner.next_move, variant, steps=400)
+            self.assertGreater(tetris.lines, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
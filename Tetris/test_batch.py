@@ -0,0 +1,98 @@
+import unittest
+import numpy as np
+import tetris_ai as ai
+import tetris_batch as batch
+import tetris_bitboard as bitboard
+import tetris_engine as engine
+
+
+def row_masks(board):
+    """
+    Row masks of one BatchEnv board, as Bitboard.row_masks.
+    """
+    bits = 1 << np.arange(board.shape[1], dtype=np.int64)
+    return ((board != batch.EMPTY) @ bits).tolist()
+
+
+class BatchEnvTest(unittest.TestCase):
+    """
+    BatchEnv games against Engine games given the same pieces and actions.
+    """
+
+    def play(self, variant, seed, steps=400):
+        env = batch.BatchEnv(8, seed=seed, auto_reset=False, variant=variant)
+        rng = np.random.default_rng(seed)
+        games = []
+        for index in range(env.n):
+            tetris = engine.Engine(bitboard.Bitboard, seed, variant)
+            # A stack of rows full but for one cell, so lines clear.
+            for row in range(variant.height - 7, variant.height - 1):
+                images = ['grey'] * variant.width
+                images[rng.integers(variant.width)] = None
+                tetris.board.set_row(row, images)
+                env.boards[index, row] = [bitboard.COLOUR_CODES[image]
+                                          for image in images]
+            tetris.board.reset_features()
+            tetris.tetro_current = tetris.new_tetro(
+                variant.shapes[env.piece[index]])
+            tetris.tetro_next = tetris.new_tetro(
+                variant.shapes[env.next_piece[index]])
+            games.append(tetris)
+
+        # Half the games take planned moves so they clear lines, the rest
+        # random ones.
+        planner = ai.Planner(lookahead=1, beam=4)
+        plans = {index: [] for index in range(0, env.n, 2)}
+        for step in range(steps):
+            actions = rng.choice(6, size=env.n,
+                                 p=[0.05, 0.15, 0.15, 0.15, 0.4, 0.1])
+            for index, moves in plans.items():
+                tetris = games[index]
+                if not moves and not tetris.game_over:
+                    target = planner.choose(tetris)
+                    if target is not None:
+                        moves[:] = ai.path(tetris.board,
+                                           tetris.tetro_current,
+                                           target) or []
+                    moves.append("drop")
+                if moves:
+                    actions[index] = 1 + engine.ACTIONS.index(moves.pop(0))
+            boards, rewards, dones = env.step(actions)
+            for index, tetris in enumerate(games):
+                if tetris.game_over:
+                    self.assertTrue(dones[index])
+                    continue
+                score = tetris.score
+                state = tetris.step(None if actions[index] == batch.NOOP
+                                    else engine.ACTIONS[actions[index] - 1])
+                if state.locked:
+                    # Follow the pieces dealt by the env.
+                    tetris.tetro_next = tetris.new_tetro(
+                        variant.shapes[env.next_piece[index]])
+                current = tetris.tetro_current
+                self.assertEqual(tetris.game_over, dones[index])
+                self.assertEqual(tetris.board.row_masks(),
+                                 row_masks(boards[index]))
+                self.assertEqual(tetris.score - score, rewards[index])
+                self.assertEqual((tetris.score, tetris.lines, tetris.level),
+                                 (env.score[index], env.lines[index],
+                                  env.level[index]))
+                if not tetris.game_over:
+                    self.assertEqual(
+                        (current.rotation, current.position[0],
+                         current.position[1]),
+                        (env.rotation[index], env.row[index],
+                         env.col[index]))
+        return sum(tetris.lines for tetris in games)
+
+    def test_standard(self):
+        lines = sum(self.play(engine.STANDARD, seed) for seed in range(2))
+        self.assertGreater(lines, 0)
+
+    def test_variants(self):
+        for name in ('wide', 'pentominos'):
+            self.play(engine.VARIANTS[name], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import random
+import unittest
+import tetris_engine as engine
+import tetris_gameboard as gameboard
+import tetris_bitboard as bitboard
+import tetris_zobrist as zobrist
+
+BOARDS = (gameboard.Gameboard, bitboard.Bitboard)
+
+# Random play with extra soft drops so pieces lock often.
+PLAY = engine.ACTIONS + ("move_d",) * 3
+
+
+def recount(board):
+    """
+    row_fill, column_heights and holes counted from scratch.
+    """
+    masks = board.row_masks()
+    bottom = len(masks) - 1
+    fill = [bin(mask).count('1') for mask in masks]
+    heights = [0] * board.WIDTH
+    holes = 0
+    for column in range(board.WIDTH):
+        top = None
+        for row in range(bottom):
+            if masks[row] >> column & 1:
+                if top is None:
+                    top = row
+            elif top is not None:
+                holes += 1
+        heights[column] = 0 if top is None else bottom - top
+    return fill, heights, holes
+
+
+def rehash(board):
+    """
+    zobrist hashed from scratch.
+    """
+    masks = board.row_masks()
+    bottom = len(masks) - 1
+    hashed = 0
+    for row in range(bottom):
+        hashed ^= zobrist.row_key(bottom - row, masks[row])
+    return hashed
+
+
+class BoardFeaturesTest(unittest.TestCase):
+    """
+    The board features against a full recount.
+    """
+
+    def check(self, board):
+        self.assertEqual((board.row_fill, board.column_heights,
+                          board.holes), recount(board))
+        self.assertEqual(board.zobrist, rehash(board))
+
+    def test_random_games(self):
+        for board_class in BOARDS:
+            for seed in range(20):
+                rng = random.Random(seed)
+                tetris = engine.Engine(board_class, seed)
+                while not tetris.game_over:
+                    tetris.step(rng.choice(PLAY))
+                    self.check(tetris.board)
+
+    def test_garbage(self):
+        for board_class in BOARDS:
+            for seed in range(10):
+                rng = random.Random(seed)
+                tetris = engine.Engine(board_class, seed)
+                while not tetris.game_over:
+                    state = tetris.step(rng.choice(PLAY))
+                    if state.locked and rng.random() < 0.3:
+                        tetris.add_garbage(rng.randint(1, 4),
+                                           rng.randrange(tetris.board.WIDTH))
+                        self.check(tetris.board)
+
+    def test_hash_follows_board_version(self):
+        for board_class in BOARDS:
+            board = board_class()
+            empty = board.zobrist
+            board.set_row(board.HEIGHT - 2, ['red'] * (board.WIDTH - 1) +
+                          [None])
+            board.reset_features()
+            self.assertNotEqual(board.zobrist, empty)
+            board.clear_lines([board.HEIGHT - 2])
+            self.check(board)
+            board.remove_row(board.HEIGHT - 2)
+            board.create_row()
+            self.assertEqual(board.zobrist, empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import random
+import unittest
+import tetris_gameboard as gameboard
+import tetris_bitboard as bitboard
+
+BOARDS = (gameboard.Gameboard, bitboard.Bitboard)
+
+
+def features(board):
+    """
+    Every board feature, for comparing boards.
+    """
+    return (list(board.row_fill), list(board.column_heights), board.holes,
+            board.zobrist)
+
+
+def random_stack(board, rng):
+    """
+    Fill a random number of rows above the bottom, some of them complete.
+    Returns the rows filled.
+    """
+    rows = range(board.HEIGHT - 1 - rng.randint(1, 20), board.HEIGHT - 1)
+    for row in rows:
+        if rng.random() < 0.4:
+            images = ['blue'] * board.WIDTH
+        else:
+            density = rng.random()
+            images = ['red' if rng.random() < density else None
+                      for column in range(board.WIDTH)]
+        board.set_row(row, images)
+    board.reset_features()
+    return rows
+
+
+class ClearLinesTest(unittest.TestCase):
+    """
+    clear_lines against removing complete rows one at a time.
+    """
+
+    def test_random_stacks(self):
+        rng = random.Random(0)
+        for trial in range(500):
+            width = rng.choice([10, 12, 16])
+            for board_class in BOARDS:
+                seeded = random.Random(trial)
+                board = board_class(23, width)
+                expected = board_class(23, width)
+                rows = random_stack(board, seeded)
+                random_stack(expected, random.Random(trial))
+                rows = seeded.sample(rows, min(len(rows),
+                                               seeded.randint(1, 5)))
+
+                complete = [row for row in sorted(rows)
+                            if expected.row_complete(row)]
+                for row in reversed(complete):
+                    expected.remove_row(row)
+                expected.resize_board()
+
+                self.assertEqual(board.clear_lines(rows), complete)
+                self.assertEqual(board.row_masks(), expected.row_masks())
+                self.assertEqual(board.board, expected.board)
+                incremental = features(board)
+                board.reset_features()
+                self.assertEqual(incremental, features(board))
+                self.assertEqual(incremental, features(expected))
+
+    def test_nothing_complete(self):
+        for board_class in BOARDS:
+            board = board_class()
+            board.set_row(board.HEIGHT - 2, ['red'] * (board.WIDTH - 1) +
+                          [None])
+            board.reset_features()
+            version = board.version
+            self.assertEqual(board.clear_lines([board.HEIGHT - 2]), [])
+            self.assertEqual(board.version, version)
+
+
+if __name__ == '__main__':
+    unittest.main()
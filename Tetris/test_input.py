@@ -0,0 +1,69 @@
+import unittest
+import tetris_input
+
+# Binary fractions, so repeat times add up exactly.
+DAS = 0.25
+ARR = 0.125
+
+
+class InputEngineTest(unittest.TestCase):
+    """
+    InputEngine repeats at fixed timestamps.
+    """
+
+    def setUp(self):
+        self.inputs = tetris_input.InputEngine(das=DAS, arr=ARR)
+
+    def test_das_then_arr(self):
+        self.inputs.press("move_l", 1.0)
+        self.assertEqual(self.inputs.due(1.2), [(1.0, "move_l")])
+        self.assertEqual(self.inputs.due(1.5), [(1.25, "move_l"),
+                                                (1.375, "move_l"),
+                                                (1.5, "move_l")])
+        self.inputs.release("move_l", 1.7)
+        self.assertEqual(self.inputs.due(3.0), [(1.625, "move_l")])
+
+    def test_polling_rate(self):
+        self.inputs.press("move_r", 0.0)
+        polled = []
+        for frame in range(1, 61):
+            polled += self.inputs.due(frame / 60)
+        self.inputs.clear()
+        self.inputs.press("move_r", 0.0)
+        self.assertEqual(polled, self.inputs.due(1.0))
+        self.assertEqual([time for time, input in polled],
+                         [0.0, 0.25, 0.375, 0.5, 0.625, 0.75, 0.875, 1.0])
+
+    def test_soft_drop_and_rotate(self):
+        self.inputs.press("move_d", 0.0)
+        self.inputs.press("rotate", 0.1)
+        self.assertEqual(self.inputs.due(0.5), [(0.0, "move_d"),
+                                                (0.1, "rotate"),
+                                                (0.125, "move_d"),
+                                                (0.25, "move_d"),
+                                                (0.375, "move_d"),
+                                                (0.5, "move_d")])
+        self.inputs.release("move_d", 0.5)
+        self.assertEqual(self.inputs.due(2.0), [])
+
+    def test_opposites(self):
+        self.inputs.press("move_l", 0.0)
+        self.inputs.press("move_r", 0.3125)
+        self.assertEqual(self.inputs.due(0.75), [(0.0, "move_l"),
+                                                 (0.25, "move_l"),
+                                                 (0.3125, "move_r"),
+                                                 (0.5625, "move_r"),
+                                                 (0.6875, "move_r")])
+        # move_l starts repeating again das after move_r is released.
+        self.inputs.release("move_r", 0.75)
+        self.assertEqual(self.inputs.due(1.25), [(1.0, "move_l"),
+                                                 (1.125, "move_l"),
+                                                 (1.25, "move_l")])
+
+    def test_bad_arr(self):
+        with self.assertRaises(ValueError):
+            tetris_input.InputEngine(arr=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import random
+import unittest
+import tetris_engine as engine
+import tetris_bitboard as bitboard
+import tetris_placement as placement
+import tetris_tetrominos as tetro
+
+# Boards up to and past the 32 rows placements handles with single masks.
+VARIANTS = (engine.STANDARD,
+            engine.VARIANTS['pentominos'],
+            engine.Variant(40, 10, engine.STANDARD.shapes),
+            engine.Variant(36, 13, tuple(tetro.PENTOMINOS)))
+
+
+def random_board(variant, rng):
+    """
+    A board with a random stack of cells, holes and overhangs included.
+    """
+    board = bitboard.Bitboard(variant.height, variant.width)
+    for row in range(rng.randrange(3, variant.height - 2),
+                     variant.height - 1):
+        board.set_row(row, ['red' if rng.random() < 0.5 else None
+                            for column in range(variant.width)])
+    board.reset_features()
+    return board
+
+
+def cells(name, rotation, row, col):
+    """
+    The cells a tetromino covers at a placement.
+    """
+    return frozenset((row + block[0], col + block[1])
+                     for block in tetro.SHAPE_TABLE[(name, rotation)].blocks)
+
+
+def search(variant, board, name):
+    """
+    The cells of every spot a tetromino locks at, found by trying every
+    Engine move from every reachable state.
+    """
+    moves = ("rotate", "move_l", "move_r", "move_d")
+    tetris = engine.Engine(bitboard.Bitboard, 0, variant)
+    tetris.board = board
+    current = tetris.tetro_current = tetris.new_tetro(name)
+    if board.collision_occured(current):
+        return set()
+    start = (current.rotation, current.position[0], current.position[1])
+    seen = {start}
+    pending = [start]
+    locked = set()
+    while pending:
+        state = pending.pop()
+        for action in moves:
+            current.rotation, current.position[0], current.position[1] = \
+                state
+            current.clear_temp_position_shape()
+            getattr(current, action)()
+            if tetris.move_valid():
+                moved = (current.temp_rotation, current.temp_position[0],
+                         current.temp_position[1])
+                if moved not in seen:
+                    seen.add(moved)
+                    pending.append(moved)
+            elif action == "move_d":
+                locked.add(cells(name, *state))
+    return locked
+
+
+class PlacementsTest(unittest.TestCase):
+    """
+    placements against a brute force search of Engine moves.
+    """
+
+    def test_random_boards(self):
+        rng = random.Random(0)
+        for variant in VARIANTS:
+            for trial in range(8):
+                board = random_board(variant, rng)
+                for name in variant.shapes:
+                    found = {cells(name, *spot)
+                             for spot in placement.placements(board, name)}
+                    self.assertEqual(
+                        len(found), len(placement.placements(board, name)))
+                    self.assertEqual(found, search(variant, board, name))
+
+    def test_blocked_spawn(self):
+        board = bitboard.Bitboard()
+        for row in range(board.HEIGHT - 1):
+            board.set_row(row, ['red'] * board.WIDTH)
+        board.reset_features()
+        self.assertEqual(placement.placements(board, 'Tetro_T'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
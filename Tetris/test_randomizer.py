@@ -0,0 +1,48 @@
+import unittest
+import tetris_engine as engine
+import tetris_randomizer as randomizer
+import tetris_tetrominos as tetro
+
+
+def dealt(seed, variant, randomizer_class, count):
+    """
+    The names of the first count pieces an Engine deals.
+    """
+    tetris = engine.Engine(seed=seed, variant=variant,
+                           randomizer_class=randomizer_class)
+    names = [tetris.tetro_current.name, tetris.tetro_next.name]
+    while len(names) < count:
+        tetris.new_tetros()
+        names.append(tetris.tetro_next.name)
+    return names[:count]
+
+
+class SequenceTest(unittest.TestCase):
+    """
+    Randomizer.sequence against the order an Engine deals pieces in.
+    """
+
+    def test_deal_order(self):
+        for randomizer_class in randomizer.RANDOMIZERS.values():
+            for variant in engine.VARIANTS.values():
+                for seed in range(3):
+                    dealer = randomizer_class(variant.shapes, seed)
+                    # Calls ending mid set carry on from the same set.
+                    pieces = []
+                    for count in (1, 3, 0, 11, 40, 45):
+                        sequence = dealer.sequence(count)
+                        self.assertEqual(len(sequence), count)
+                        pieces += [tetro.NAMES[index] for index in sequence]
+                    self.assertEqual(pieces, dealt(seed, variant,
+                                                   randomizer_class, 100))
+
+    def test_copy(self):
+        for randomizer_class in randomizer.RANDOMIZERS.values():
+            dealer = randomizer_class(engine.STANDARD.shapes, 0)
+            dealer.sequence(5)
+            clone = dealer.copy()
+            self.assertEqual(clone.sequence(30), dealer.sequence(30))
+
+
+if __name__ == '__main__':
+    unittest.main()
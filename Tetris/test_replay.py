@@ -0,0 +1,72 @@
+import io
+import os
+import random
+import tempfile
+import unittest
+import tetris_ai as ai
+import tetris_engine as engine
+import tetris_gameboard as gameboard
+import tetris_randomizer as randomizer
+import tetris_replay as replay
+
+
+def record(path, seed, variant=engine.STANDARD,
+           randomizer_class=randomizer.BagRandomizer, ticks=600):
+    """
+    Play a game recorded to path, as Tetris_Game does, with planned moves
+    on some ticks so lines clear, and return its engine.
+    """
+    tetris = engine.Engine(gameboard.Gameboard, seed, variant,
+                           randomizer_class)
+    recorder = replay.Recorder(open(path, 'wb'), tetris, seed)
+    rng = random.Random(seed)
+    planner = ai.Planner(lookahead=1, beam=4)
+    for tick in range(ticks):
+        if tetris.game_over:
+            break
+        actions = []
+        if rng.random() < 0.3:
+            actions.append(planner.next_move(tetris))
+        recorder.record_tick(tetris.ticks, actions)
+        tetris.tick(actions)
+    recorder.close()
+    return tetris
+
+
+class ReplayTest(unittest.TestCase):
+    """
+    Recorded games replayed to the same final state.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'game.replay')
+
+    def check(self, *args):
+        tetris = record(self.path, *args)
+        with open(self.path, 'rb') as stream:
+            replayed = replay.play(stream)
+        self.assertEqual(replayed.snapshot(), tetris.snapshot())
+        self.assertEqual(replayed.ticks, tetris.ticks)
+
+    def test_seeds(self):
+        for seed in (0, 1, 2 ** 64 - 1):
+            self.check(seed)
+
+    def test_variant_and_randomizer(self):
+        self.check(5, engine.VARIANTS['pentominos'],
+                   randomizer.HistoryRandomizer)
+
+    def test_bad_seed(self):
+        for seed in (-1, "seed", b"seed", 1.5):
+            with self.assertRaises(ValueError):
+                replay.Recorder(io.BytesIO(), engine.Engine(), seed)
+
+    def test_not_a_replay(self):
+        with self.assertRaises(replay.ReplayError):
+            replay.play(io.BytesIO(b'not a replay'))
+
+
+if __name__ == '__main__':
+    unittest.main()
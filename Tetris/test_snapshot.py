@@ -0,0 +1,90 @@
+import random
+import unittest
+import tetris_ai as ai
+import tetris_engine as engine
+import tetris_gameboard as gameboard
+import tetris_bitboard as bitboard
+
+
+def play(tetris, actions):
+    """
+    Tick tetris once per entry of actions and return it.
+    """
+    for action in actions:
+        tetris.tick(action)
+    return tetris
+
+
+def moves(seed, tetris, ticks):
+    """
+    Planned moves on some ticks and none on the rest, as a player would.
+    """
+    rng = random.Random(seed)
+    planner = ai.Planner(lookahead=1, beam=4)
+    actions = []
+    for tick in range(ticks):
+        action = []
+        if rng.random() < 0.3:
+            action.append(planner.next_move(tetris))
+        actions.append(action)
+        tetris.tick(action)
+    return actions
+
+
+class SnapshotTest(unittest.TestCase):
+    """
+    Games restored from a snapshot against the game they were taken from.
+    """
+
+    def check(self, restored, original):
+        self.assertEqual(restored.snapshot(), original.snapshot())
+        self.assertEqual(restored.board.row_masks(),
+                         original.board.row_masks())
+        self.assertEqual(restored.zobrist(), original.zobrist())
+
+    def test_restore_and_play(self):
+        lines = 0
+        for board_class in (gameboard.Gameboard, bitboard.Bitboard):
+            for variant in (engine.STANDARD, engine.VARIANTS['pentominos']):
+                tetris = engine.Engine(board_class, 3, variant)
+                moves(3, tetris, 300)
+                snapshot = tetris.snapshot()
+                dealer = tetris.randomizer.copy()
+                later = moves(4, tetris, 300)
+                lines += tetris.lines
+
+                # Into a fresh engine, given the randomizer's state too.
+                restored = engine.Engine(board_class, variant=variant)
+                restored.restore(snapshot)
+                restored.randomizer = dealer.copy()
+                self.check(play(restored, later), tetris)
+
+                # Back into the original engine.
+                final = tetris.snapshot()
+                tetris.restore(snapshot)
+                tetris.randomizer = dealer
+                self.check(play(tetris, later), restored)
+                self.assertEqual(tetris.snapshot(), final)
+        self.assertGreater(lines, 0)
+
+    def test_copy(self):
+        tetris = engine.Engine(bitboard.Bitboard, 5)
+        moves(5, tetris, 300)
+        clone = tetris.copy()
+        later = moves(6, tetris, 300)
+        self.check(play(clone, later), tetris)
+
+    def test_across_backends(self):
+        tetris = engine.Engine(gameboard.Gameboard, 7)
+        moves(7, tetris, 300)
+        restored = engine.Engine(bitboard.Bitboard)
+        restored.restore(tetris.snapshot())
+        self.check(restored, tetris)
+
+    def test_not_a_snapshot(self):
+        with self.assertRaises(ValueError):
+            engine.Engine().restore(b'not a snapshot')
+
+
+if __name__ == '__main__':
+    unittest.main()
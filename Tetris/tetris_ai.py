@@ -0,0 +1,349 @@
+import collections
+import concurrent.futures
+import tetris_tetrominos as tetro
+import tetris_placement as placement
+
+# Heuristic weights for a board after a placement.
+WEIGHTS = {'height': -0.510066,
+           'lines': 0.760666,
+           'holes': -0.35663,
+           'bumpiness': -0.184483}
+
+LOST = float('-inf')
+
+
+class Rows(object):
+    """
+    A board held as a tuple of row masks, enough of a board for
+    tetris_placement. Cheap to hash and to send to worker processes.
+    """
+
+    def __init__(self, rows, width):
+        self.rows = rows
+        self.HEIGHT = len(rows)
+        self.WIDTH = width
+
+    def row_masks(self):
+        """
+        One bitmask per row, bit n set when column n is occupied.
+        """
+        return self.rows
+
+
+def lock(rows, width, name, target):
+    """
+    The rows after tetromino name is locked at target and complete lines
+    are removed, and the number of lines removed.
+    """
+    entry = tetro.SHAPE_TABLE[(name, target.rotation)]
+    shift = target.col + entry.bounds[1]
+    rows = list(rows)
+    for row_offset, mask in entry.row_masks:
+        rows[target.row + row_offset] |= mask << shift
+
+    full = (1 << width) - 1
+    kept = [row for row in rows[:-1] if row != full]
+    cleared = len(rows) - 1 - len(kept)
+    if cleared:
+        rows = [0] * cleared + kept + rows[-1:]
+    return tuple(rows), cleared
+
+
+def evaluate(rows, width, lines):
+    """
+    Heuristic value of a board from its aggregate column height, holes
+    and bumpiness and the lines cleared reaching it.
+    """
+    playable = len(rows) - 1
+    heights = [0] * width
+    covered = 0
+    holes = 0
+    for index in range(playable):
+        row = rows[index]
+        holes += bin(covered & ~row).count('1')
+        new = row & ~covered
+        while new:
+            low = new & -new
+            new ^= low
+            heights[low.bit_length() - 1] = playable - index
+        covered |= row
+
+    return score(heights, holes, lines)
+
+
+def evaluate_board(board, lines=0):
+    """
+    Heuristic value of a board from the features it tracks, without
+    scanning it.
+    """
+    return score(board.column_heights, board.holes, lines)
+
+
+def score(heights, holes, lines):
+    """
+    Weighted sum of the heuristic features.
+    """
+    bumpiness = sum(abs(heights[column] - heights[column + 1])
+                    for column in range(len(heights) - 1))
+    return (WEIGHTS['height'] * sum(heights) +
+            WEIGHTS['lines'] * lines +
+            WEIGHTS['holes'] * holes +
+            WEIGHTS['bumpiness'] * bumpiness)
+
+
+class Search(object):
+    """
+    Beam search through a known sequence of tetrominos, followed by
+    expectimax over unknown ones.
+    Each ply keeps only the beam best placements by heuristic value.
+    Values of boards already searched at the same ply are reused from a
+    transposition table keyed by the board rows.
+    """
+
+    def __init__(self, width, beam=6, table_size=200000,
+                 shapes=tuple(tetro.SHAPES)):
+        """
+        shapes are the pieces an unknown piece may be.
+        """
+        self.width = width
+        self.shapes = shapes
+        self.beam = beam
+        self.table_size = table_size
+        self.table = {}
+
+    def children(self, rows, name):
+        """
+        Boards reachable by placing name, best first, as
+        (heuristic, rows, lines, target) up to the beam width.
+        """
+        options = []
+        for target in placement.placements(Rows(rows, self.width), name):
+            child, lines = lock(rows, self.width, name, target)
+            options.append((evaluate(child, self.width, lines),
+                            child, lines, target))
+        options.sort(key=lambda option: option[0], reverse=True)
+        return options[:self.beam]
+
+    def value(self, rows, pieces, depth):
+        """
+        Best value reachable from rows when placing pieces[0:depth], the
+        heuristic value of the final board plus the lines cleared on the
+        way. A piece of None means any of shapes, equally likely.
+        """
+        if depth == 0 or not pieces:
+            return evaluate(rows, self.width, 0)
+        key = (rows, tuple(pieces[:depth]))
+        if key in self.table:
+            return self.table[key]
+
+        if pieces[0] is None:
+            names = self.shapes
+        else:
+            names = [pieces[0]]
+        total = 0.0
+        for name in names:
+            best = LOST
+            for heuristic, child, lines, target in self.children(rows, name):
+                best = max(best, WEIGHTS['lines'] * lines +
+                           self.value(child, pieces[1:], depth - 1))
+            total += best
+        result = total / len(names)
+
+        if len(self.table) >= self.table_size:
+            self.table.clear()
+        self.table[key] = result
+        return result
+
+
+# Search of a worker process, kept between jobs so its transposition
+# table carries over from one branch and one move to the next.
+_worker_search = None
+
+
+def _start_worker(width, beam, shapes):
+    """
+    Worker initializer, creates the Search every job of the worker uses.
+    """
+    global _worker_search
+    _worker_search = Search(width, beam, shapes=shapes)
+
+
+def _search_branch(args):
+    """
+    Worker entry point, value of one root branch.
+    """
+    rows, pieces, depth = args
+    return _worker_search.value(rows, pieces, depth)
+
+
+class Planner(object):
+    """
+    Chooses where to place the current tetromino of an engine.
+
+    The search looks at the current tetromino, tetro_next and the rest of
+    the bag in the order they will be drawn, up to lookahead pieces, and
+    treats any further pieces as unknown. With workers the root branches
+    are searched in a process pool.
+
+    A Planner can be used as a tetris_runner policy, it returns the next
+    move towards its chosen placement.
+    """
+
+    def __init__(self, lookahead=2, beam=6, workers=0):
+        self.lookahead = lookahead
+        self.beam = beam
+        self.workers = workers
+        self.pool = None
+        self.pool_settings = None
+        self.search = None
+        self.planned = None
+        self.target = None
+
+    def __getstate__(self):
+        """
+        Only the settings are pickled, plans and pools stay behind.
+        """
+        return {'lookahead': self.lookahead,
+                'beam': self.beam,
+                'workers': self.workers}
+
+    def __setstate__(self, state):
+        """
+        Rebuild an unplanned Planner from its settings.
+        """
+        self.__init__(**state)
+
+    def pieces(self, tetris):
+        """
+        The tetrominos after tetro_current, known ones first.
+        """
+        known = [tetris.tetro_next.name] + tetris.tetro_set[::-1]
+        known = known[:self.lookahead - 1]
+        return known + [None] * (self.lookahead - 1 - len(known))
+
+    def choose(self, tetris):
+        """
+        The placement of tetris.tetro_current leading to the best value,
+        None if it has nowhere to go.
+        """
+        width = tetris.board.WIDTH
+        shapes = tetris.variant.shapes
+        if (self.search is None or self.search.width != width or
+                self.search.shapes != shapes):
+            self.search = Search(width, self.beam, shapes=shapes)
+        rows = tuple(tetris.board.row_masks())
+        current = tetris.tetro_current
+        pieces = self.pieces(tetris)
+
+        options = []
+        for target in placement.placements(
+                Rows(rows, width), current.name,
+                current.rotation, current.position):
+            child, lines = lock(rows, width, current.name, target)
+            options.append((evaluate(child, width, lines), child, lines,
+                            target))
+        if not options:
+            return None
+        options.sort(key=lambda option: option[0], reverse=True)
+        options = options[:self.beam]
+
+        jobs = [(child, pieces, len(pieces))
+                for heuristic, child, lines, target in options]
+        if self.workers:
+            settings = (width, self.beam, shapes)
+            if self.pool is not None and self.pool_settings != settings:
+                self.close()
+            if self.pool is None:
+                self.pool = concurrent.futures.ProcessPoolExecutor(
+                    self.workers, initializer=_start_worker,
+                    initargs=settings)
+                self.pool_settings = settings
+            values = list(self.pool.map(_search_branch, jobs))
+        else:
+            values = [self.search.value(*job) for job in jobs]
+
+        best = max(range(len(options)),
+                   key=lambda index: (WEIGHTS['lines'] * options[index][2] +
+                                      values[index]))
+        return options[best][3]
+
+    def next_move(self, tetris):
+        """
+        The next action moving tetro_current towards its chosen placement,
+        move_d once it is there. Plans afresh for each new tetromino.
+        """
+        current = tetris.tetro_current
+        if self.planned is not current:
+            self.planned = current
+            self.target = self.choose(tetris)
+        if self.target is None:
+            return "move_d"
+        moves = path(tetris.board, current, self.target)
+        if moves is None:
+            # Knocked off course, such as by gravity, so plan again.
+            self.target = self.choose(tetris)
+            if self.target is None:
+                return "move_d"
+            moves = path(tetris.board, current, self.target) or []
+        if not moves:
+            return "move_d"
+        return moves[0]
+
+    def __call__(self, tetris, rng):
+        """
+        tetris_runner policy interface.
+        """
+        return self.next_move(tetris)
+
+    def close(self):
+        """
+        Shut down the worker pool.
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+def path(board, tetromino, target):
+    """
+    Shortest list of actions taking tetromino from its position to target,
+    None if target cannot be reached.
+    """
+    name = tetromino.name
+    free = placement.fits(board, name)
+    left = placement.PADDING[name]
+    stride = board.WIDTH + left + 1
+    rotations = tetro.ROTATIONS[name]
+
+    def fits(state):
+        """
+        Whether the tetromino lies on the board at state.
+        """
+        rotation, row, col = state
+        return (-left <= col < board.WIDTH and row >= 0 and
+                free[rotation * stride + col + left] >> row & 1)
+
+    start = (tetromino.rotation,
+             tetromino.position[0],
+             tetromino.position[1])
+    goal = tuple(target)
+    previous = {start: None}
+    queue = collections.deque([start])
+    while queue:
+        state = queue.popleft()
+        if state == goal:
+            moves = []
+            while previous[state] is not None:
+                state, action = previous[state]
+                moves.append(action)
+            return moves[::-1]
+        rotation, row, col = state
+        for action, move in (("rotate",
+                              ((rotation + 1) % rotations, row, col)),
+                             ("move_l", (rotation, row, col - 1)),
+                             ("move_r", (rotation, row, col + 1)),
+                             ("move_d", (rotation, row + 1, col))):
+            if move not in previous and fits(move):
+                previous[move] = (state, action)
+                queue.append(move)
+    return None
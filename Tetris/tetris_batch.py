@@ -0,0 +1,262 @@
+import numpy as np
+import tetris_tetrominos as tetro
+import tetris_engine as engine
+import tetris_bitboard as bitboard
+
+# Action codes, NOOP followed by tetris_engine.ACTIONS in order.
+NOOP = 0
+ROTATE = 1
+MOVE_L = 2
+MOVE_R = 3
+MOVE_D = 4
+DROP = 5
+
+EMPTY = bitboard.COLOUR_CODES[None]
+BOTTOM = bitboard.COLOUR_CODES['bottom']
+
+
+def build_tables(shapes=tuple(tetro.SHAPES)):
+    """
+    Convert the SHAPE_TABLE entries of shapes into arrays indexed by
+    [piece, rotation, block] with pieces in shapes order.
+    Pieces with fewer than four rotation states repeat their states.
+    Every piece must have the same number of blocks.
+    """
+    pieces = len(shapes)
+    blocks = len(tetro.SHAPE_TABLE[(shapes[0], 0)].blocks)
+    block_rows = np.zeros((pieces, 4, blocks), dtype=np.int64)
+    block_cols = np.zeros((pieces, 4, blocks), dtype=np.int64)
+    rotations = np.zeros(pieces, dtype=np.int64)
+    colours = np.zeros(pieces, dtype=np.uint8)
+    for piece, name in enumerate(shapes):
+        rotations[piece] = tetro.ROTATIONS[name]
+        colours[piece] = bitboard.COLOUR_CODES[tetro.DEFINITIONS[name][2]]
+        for rotation in range(4):
+            entry = tetro.SHAPE_TABLE[(name, rotation % rotations[piece])]
+            for block, (row, col) in enumerate(entry.blocks):
+                block_rows[piece, rotation, block] = row
+                block_cols[piece, rotation, block] = col
+    return block_rows, block_cols, rotations, colours
+
+
+BLOCK_ROWS, BLOCK_COLS, ROTATIONS, COLOURS = build_tables()
+
+# build_tables results by shapes, so each piece set is converted once.
+TABLES = {tuple(tetro.SHAPES): (BLOCK_ROWS, BLOCK_COLS, ROTATIONS, COLOURS)}
+POINTS = np.array([0] + [engine.POINTS[lines]
+                         for lines in range(1, len(engine.POINTS) + 1)],
+                  dtype=np.int64)
+
+
+class BatchEnv(object):
+    """
+    Steps N games of Tetris at once with vectorised numpy operations.
+
+    Boards are held as an (N, height, width) uint8 array of
+    tetris_bitboard.COLOUR_CODES, the final row of each being the bottom.
+    Movement, collision, line clears, levels and scoring follow
+    tetris_engine.Engine, actions are given as codes NOOP to DROP.
+    Pieces are numbered by their index in the variant shapes.
+    """
+
+    def __init__(self, n, seed=None, auto_reset=True,
+                 variant=engine.STANDARD):
+        """
+        auto_reset restarts each game as soon as it is over.
+        variant sets the board size and pieces, as for Engine.
+        """
+        self.n = n
+        self.auto_reset = auto_reset
+        self.height = variant.height
+        self.width = variant.width
+        self.shapes = tuple(variant.shapes)
+        if self.shapes not in TABLES:
+            TABLES[self.shapes] = build_tables(self.shapes)
+        (self.block_rows, self.block_cols,
+         self.rotations, self.colours) = TABLES[self.shapes]
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """
+        Start N new games and return the boards.
+        """
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((self.n, self.height, self.width),
+                               dtype=np.uint8)
+        self.piece = np.zeros(self.n, dtype=np.int64)
+        self.next_piece = np.zeros(self.n, dtype=np.int64)
+        self.rotation = np.zeros(self.n, dtype=np.int64)
+        self.row = np.zeros(self.n, dtype=np.int64)
+        self.col = np.zeros(self.n, dtype=np.int64)
+        self.bags = np.zeros((self.n, len(self.shapes)), dtype=np.int64)
+        self.bag_index = np.zeros(self.n, dtype=np.int64)
+        self.score = np.zeros(self.n, dtype=np.int64)
+        self.lines = np.zeros(self.n, dtype=np.int64)
+        self.level = np.zeros(self.n, dtype=np.int64)
+        self.done = np.zeros(self.n, dtype=bool)
+        self.reset_games(np.arange(self.n))
+        return self.boards
+
+    def reset_games(self, games):
+        """
+        Restart the games at the given indices.
+        """
+        self.boards[games] = EMPTY
+        self.boards[games, -1] = BOTTOM
+        self.bags[games] = self.new_bags(len(games))
+        self.bag_index[games] = 0
+        self.score[games] = 0
+        self.lines[games] = 0
+        self.level[games] = 1
+        self.done[games] = False
+        self.piece[games] = self.draw(games)
+        self.next_piece[games] = self.draw(games)
+        self.spawn(games)
+
+    def new_bags(self, count):
+        """
+        Create count randomised bags with one of every piece.
+        """
+        bags = np.tile(np.arange(len(self.shapes)), (count, 1))
+        return self.rng.permuted(bags, axis=1)
+
+    def draw(self, games):
+        """
+        Take the next tetromino from the bag of each game.
+        """
+        pieces = self.bags[games, self.bag_index[games]]
+        self.bag_index[games] += 1
+        empty = games[self.bag_index[games] == self.bags.shape[1]]
+        if len(empty):
+            self.bags[empty] = self.new_bags(len(empty))
+            self.bag_index[empty] = 0
+        return pieces
+
+    def spawn(self, games):
+        """
+        Place the current tetromino of each game at the spawn position.
+        Games where it collides are over.
+        """
+        self.rotation[games] = 0
+        self.row[games] = 0
+        self.col[games] = tetro.spawn_column(self.width)
+        self.done[games] = self.collision(games, self.piece[games],
+                                          self.rotation[games],
+                                          self.row[games], self.col[games])
+
+    def cells(self, piece, rotation, row, col):
+        """
+        Absolute rows and columns of every block,
+        shape (len(piece), blocks).
+        """
+        rows = self.block_rows[piece, rotation] + row[:, None]
+        cols = self.block_cols[piece, rotation] + col[:, None]
+        return rows, cols
+
+    def collision(self, games, piece, rotation, row, col):
+        """
+        Checks whether each tetromino leaves the board or overlaps an
+        occupied cell, as Engine.move_valid.
+        """
+        rows, cols = self.cells(piece, rotation, row, col)
+        outside = ((rows < 0) | (rows >= self.height) |
+                   (cols < 0) | (cols >= self.width))
+        occupied = self.boards[games[:, None],
+                               np.clip(rows, 0, self.height - 1),
+                               np.clip(cols, 0, self.width - 1)] != EMPTY
+        return (outside | occupied).any(axis=1)
+
+    def step(self, actions):
+        """
+        Apply one action code to every game.
+        Returns the boards, the points scored by each game and whether each
+        game is over. With auto_reset, games that ended have already been
+        restarted in the returned boards.
+        """
+        actions = np.asarray(actions)
+        games = np.flatnonzero(~self.done & (actions != NOOP))
+        actions = actions[games]
+        piece = self.piece[games]
+
+        rotation = np.where(actions == ROTATE,
+                            (self.rotation[games] + 1) %
+                            self.rotations[piece],
+                            self.rotation[games])
+        row = self.row[games] + (actions == MOVE_D)
+        col = (self.col[games] - (actions == MOVE_L)
+               + (actions == MOVE_R))
+
+        blocked = self.collision(games, piece, rotation, row, col)
+        moved = ~blocked
+        self.rotation[games[moved]] = rotation[moved]
+        self.row[games[moved]] = row[moved]
+        self.col[games[moved]] = col[moved]
+
+        dropping = actions == DROP
+        if dropping.any():
+            self.drop(games[dropping])
+
+        rewards = np.zeros(self.n, dtype=np.int64)
+        locked = games[(blocked & (actions == MOVE_D)) | dropping]
+        if len(locked):
+            rewards[locked] = self.lock(locked)
+            self.piece[locked] = self.next_piece[locked]
+            self.next_piece[locked] = self.draw(locked)
+            self.spawn(locked)
+
+        dones = self.done.copy()
+        if self.auto_reset and dones.any():
+            self.reset_games(np.flatnonzero(dones))
+        return self.boards, rewards, dones
+
+    def drop(self, games):
+        """
+        Move the current tetromino of each game straight down until it
+        lands, in one pass. Each block can fall as far as the first
+        occupied cell below it in its column, the piece falls as far as
+        its shortest such gap.
+        """
+        rows, cols = self.cells(self.piece[games], self.rotation[games],
+                                self.row[games], self.col[games])
+        # Cells of each block's column, shape (len(games), blocks, height).
+        columns = self.boards[games[:, None], :, cols] != EMPTY
+        columns &= np.arange(self.height) > rows[:, :, None]
+        # The bottom row is always occupied, so every column has a cell.
+        gaps = columns.argmax(axis=2) - rows - 1
+        self.row[games] += gaps.min(axis=1)
+
+    def lock(self, games):
+        """
+        Fix the current tetromino of each game to its board, clear complete
+        lines and update scores. Returns the points scored.
+        """
+        piece = self.piece[games]
+        rows, cols = self.cells(piece, self.rotation[games],
+                                self.row[games], self.col[games])
+        self.boards[games[:, None], rows, cols] = \
+            self.colours[piece][:, None]
+
+        full = (self.boards[games, :-1] != EMPTY).all(axis=2)
+        cleared = full.sum(axis=1)
+        clearing = cleared > 0
+        if not clearing.any():
+            return np.zeros(len(games), dtype=np.int64)
+
+        # Stable sort puts complete rows on top in order, then blank them.
+        games = games[clearing]
+        full = full[clearing]
+        order = np.argsort(~full, axis=1, kind='stable')
+        boards = self.boards[games, :-1]
+        boards = np.take_along_axis(boards, order[:, :, None], axis=1)
+        blank = (np.arange(self.height - 1)[None, :] <
+                 cleared[clearing][:, None])
+        boards[blank] = EMPTY
+        self.boards[games, :-1] = boards
+
+        # update scores
+        self.lines[games] += cleared[clearing]
+        self.level[games] += self.lines[games] % 10 == 0
+        points = np.zeros(len(clearing), dtype=np.int64)
+        points[clearing] = POINTS[cleared[clearing]] * self.level[games]
+        self.score[games] += points[clearing]
+        return points
@@ -0,0 +1,338 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import tetris_bitboard as bitboard
+import tetris_engine as engine
+import tetris_gameboard as gameboard
+import tetris_randomizer as randomizer_module
+import tetris_tetrominos as tetro
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "benchmark_baseline.json")
+
+# name: function returning (prepare, op). prepare may be None, otherwise
+# it runs untimed before every op.
+BENCHMARKS = {}
+
+
+class Skip(Exception):
+    """
+    Raised by a benchmark that cannot run in this environment.
+    """
+
+
+def benchmark(name):
+    """
+    Register a benchmark setup function under name.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def stacked_board(board_class, seed=0, rows=8):
+    """
+    A board with its bottom rows filled except for one gap per row.
+    """
+    board = board_class()
+    rng = random.Random(seed)
+    filler = tetro.Tetro_O()
+    for row in range(board.HEIGHT - 1 - rows, board.HEIGHT - 1):
+        gap = rng.randrange(board.WIDTH)
+        for column in range(board.WIDTH):
+            if column != gap:
+                fill_cell(board, filler, row, column)
+    board.reset_features()
+    return board
+
+
+def fill_cell(board, tetro, row, column):
+    """
+    Lock a single block of tetro's colour into the board.
+    The board features are left for the caller to reset.
+    """
+    if isinstance(board, bitboard.Bitboard):
+        board.rows[row] |= 1 << column
+        board.cells[row * board.WIDTH + column] = \
+            bitboard.COLOUR_CODES[tetro.image]
+    else:
+        board.board[row][column] = tetro.image
+
+
+@benchmark("tetromino.absolute_position")
+def bench_absolute_position():
+    piece = tetro.Tetro_T()
+    return None, piece.absolute_position
+
+
+@benchmark("tetromino.rotate")
+def bench_rotate():
+    piece = tetro.Tetro_T()
+
+    def op():
+        piece.rotate()
+        piece.keep_temp_position_shape()
+    return None, op
+
+
+def bench_collision(board_class):
+    board = stacked_board(board_class)
+    piece = tetro.Tetro_T()
+    piece.temp_position = [12, 4]
+    return None, lambda: board.collision_occured(piece)
+
+
+def bench_row_complete(board_class):
+    board = stacked_board(board_class)
+    return None, lambda: board.row_complete(20)
+
+
+def bench_landing_row(board_class):
+    """
+    Find where a tetromino above a stacked board lands, alternating
+    between two columns so the cached row is never reused.
+    """
+    tetris = engine.Engine(board_class, seed=0)
+    tetris.board = stacked_board(board_class)
+    piece = tetro.Tetro_T()
+    tetris.tetro_current = piece
+
+    def op():
+        piece.position[1] = piece.temp_position[1] = 7 - piece.position[1]
+        tetris.landing_row()
+    return None, op
+
+
+def bench_line_clear(board_class):
+    """
+    Lock a vertical line that completes the bottom four rows.
+    """
+    tetris = engine.Engine(board_class, seed=0)
+
+    def prepare():
+        tetris.board = board_class()
+        filler = tetro.Tetro_O()
+        for row in range(tetris.board.HEIGHT - 5, tetris.board.HEIGHT - 1):
+            for column in range(1, tetris.board.WIDTH):
+                fill_cell(tetris.board, filler, row, column)
+        tetris.board.reset_features()
+        line = tetro.Tetro_Line()
+        line.rotate()
+        line.keep_temp_position_shape()
+        line.position[:] = [tetris.board.HEIGHT - 4, -1]
+        line.clear_temp_position_shape()
+        tetris.tetro_current = line
+    return prepare, tetris.fix_tetro_position
+
+
+for backend, board_class in (("gameboard", gameboard.Gameboard),
+                             ("bitboard", bitboard.Bitboard)):
+    benchmark(backend + ".collision_occured")(
+        lambda board_class=board_class: bench_collision(board_class))
+    benchmark(backend + ".row_complete")(
+        lambda board_class=board_class: bench_row_complete(board_class))
+    benchmark(backend + ".landing_row")(
+        lambda board_class=board_class: bench_landing_row(board_class))
+    benchmark(backend + ".fix_tetro_position_tetris")(
+        lambda board_class=board_class: bench_line_clear(board_class))
+
+
+def bench_sequence(randomizer_class):
+    """
+    Deal 7000 pieces at a time in bulk.
+    """
+    randomizer = randomizer_class(tetro.SHAPES, seed=0)
+    return None, lambda: randomizer.sequence(7000)
+
+
+for name, randomizer_class in randomizer_module.RANDOMIZERS.items():
+    benchmark("randomizer." + name + ".sequence")(
+        lambda randomizer_class=randomizer_class:
+        bench_sequence(randomizer_class))
+
+
+@benchmark("engine.headless_game")
+def bench_headless_game():
+    """
+    Play a whole game with random moves, seeds cycle through 0 to 9.
+    """
+    seeds = iter(range(1 << 30))
+
+    def op():
+        seed = next(seeds) % 10
+        rng = random.Random(seed)
+        tetris = engine.Engine(bitboard.Bitboard, seed)
+        actions = ("rotate", "move_l", "move_r",
+                   "move_d", "move_d", "move_d")
+        while not tetris.game_over:
+            tetris.step(rng.choice(actions))
+    return None, op
+
+
+@benchmark("interface.update_display")
+def bench_update_display():
+    """
+    Draw a moving tetromino over a stacked board to a dummy video driver.
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    try:
+        import tetris_interface as interface
+    except ImportError:
+        raise Skip("pygame is not installed")
+
+    display = interface.Interface()
+
+    class Player(object):
+        score = 0
+
+    board = stacked_board(bitboard.Bitboard)
+    piece = tetro.Tetro_T()
+    following = tetro.Tetro_L()
+    moves = ["move_r", "move_d", "move_l", "rotate"]
+    counter = [0]
+
+    def op():
+        counter[0] += 1
+        getattr(piece, moves[counter[0] % len(moves)])()
+        if board.collision_occured(piece):
+            piece.clear_temp_position_shape()
+        else:
+            piece.keep_temp_position_shape()
+        display.update_display(board, piece, following, Player, counter[0])
+    return None, op
+
+
+def measure(setup, min_time=0.5):
+    """
+    Run a benchmark for at least min_time seconds.
+    Returns ops per second, the peak bytes allocated by one op and the
+    memory blocks left allocated per op.
+    """
+    prepare, op = setup()
+
+    # Peak allocation of a single op
+    if prepare is not None:
+        prepare()
+    op()
+    if prepare is not None:
+        prepare()
+    tracemalloc.start()
+    start_size = tracemalloc.get_traced_memory()[0]
+    op()
+    alloc_peak_bytes = tracemalloc.get_traced_memory()[1] - start_size
+    tracemalloc.stop()
+
+    ops = 0
+    elapsed = 0.0
+    start_blocks = sys.getallocatedblocks()
+    batch = 1
+    while elapsed < min_time:
+        if prepare is None:
+            start = time.perf_counter()
+            for _ in range(batch):
+                op()
+            elapsed += time.perf_counter() - start
+        else:
+            for _ in range(batch):
+                prepare()
+                start = time.perf_counter()
+                op()
+                elapsed += time.perf_counter() - start
+        ops += batch
+        batch *= 2
+    net_blocks = (sys.getallocatedblocks() - start_blocks) / ops
+
+    return {"ops_per_sec": ops / elapsed,
+            "alloc_peak_bytes": alloc_peak_bytes,
+            "net_blocks_per_op": net_blocks}
+
+
+def run(names=None, min_time=0.5):
+    """
+    Run the named benchmarks, all by default, and return their results.
+    """
+    results = {}
+    for name in sorted(BENCHMARKS):
+        if names and name not in names:
+            continue
+        try:
+            results[name] = measure(BENCHMARKS[name], min_time)
+        except Skip as reason:
+            results[name] = {"skipped": str(reason)}
+    return {"python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results}
+
+
+def compare(report, baseline, tolerance):
+    """
+    Compare ops per second against the baseline.
+    Returns lines describing each benchmark and the names that regressed.
+    """
+    lines = []
+    regressions = []
+    for name, result in sorted(report["results"].items()):
+        if "skipped" in result:
+            lines.append("{:40} skipped: {}".format(name, result["skipped"]))
+            continue
+        base = baseline.get("results", {}).get(name, {})
+        line = "{:40} {:>14.1f} ops/s {:>8} B peak".format(
+            name, result["ops_per_sec"], result["alloc_peak_bytes"])
+        if "ops_per_sec" in base:
+            change = result["ops_per_sec"] / base["ops_per_sec"] - 1
+            line += " {:+7.1%}".format(change)
+            if change < -tolerance:
+                line += " REGRESSION"
+                regressions.append(name)
+        lines.append(line)
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Tetris hot paths.")
+    parser.add_argument("names", nargs="*",
+                        help="benchmarks to run, all by default")
+    parser.add_argument("--baseline", default=BASELINE_PATH,
+                        help="baseline results to compare against")
+    parser.add_argument("--output", help="write results as JSON to a file")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="fractional slowdown reported as a regression")
+    parser.add_argument("--min-time", type=float, default=0.5,
+                        help="seconds to run each benchmark for")
+    args = parser.parse_args(argv)
+
+    report = run(args.names, args.min_time)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as stored:
+            baseline = json.load(stored)
+    lines, regressions = compare(report, baseline, args.tolerance)
+    print("\n".join(lines))
+
+    if args.update_baseline:
+        baseline.setdefault("results", {}).update(report["results"])
+        baseline["python"] = report["python"]
+        baseline["machine"] = report["machine"]
+        with open(args.baseline, "w") as stored:
+            json.dump(baseline, stored, indent=2, sort_keys=True)
+            stored.write("\n")
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
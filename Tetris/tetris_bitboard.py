@@ -0,0 +1,234 @@
+import tetris_gameboard as gameboard
+
+COLOURS = (None,
+           'blue',
+           'pink',
+           'orange',
+           'red',
+           'green',
+           'darkblue',
+           'yellow',
+           'bottom',
+           'grey')
+COLOUR_CODES = {colour: code for code, colour in enumerate(COLOURS)}
+
+
+class Bitboard(gameboard.BoardFeatures):
+    '''
+    Holds info on the current board state as one integer bitmask per row.
+    A drop-in alternative to tetris_gameboard.Gameboard.
+
+    Bit n of a row mask is set when column n is occupied.
+    Colours are kept separately in a flat bytearray, one byte per cell,
+    holding an index into COLOURS. Rows are removed and re-created by
+    shifting this plane in place, so it never changes size.
+
+    Rows:
+        HIDDEN_ROWS
+        IN_PLAY = HEIGHT - 1 - HIDDEN_ROWS
+        BOTTOM
+    '''
+
+    def __init__(self, height=23, width=10, hidden_rows=2):
+        """
+        Initialises the board to be a WIDTH x HEIGHT matrix.
+        The first HEIGHT - 1 rows are empty.
+        The final row is full and coloured "bottom".
+        """
+        self.HEIGHT = height
+        self.HIDDEN_ROWS = hidden_rows
+        self.WIDTH = width
+        self.FULL_ROW = (1 << self.WIDTH) - 1
+
+        self.rows = [0] * (self.HEIGHT - 1)
+        self.rows.append(self.FULL_ROW)
+
+        self.cells = bytearray(self.HEIGHT * self.WIDTH)
+        self.cells[-self.WIDTH:] = bytes(
+            [COLOUR_CODES['bottom']] * self.WIDTH)
+
+        # Incremented whenever the contents of the board change.
+        self.version = 0
+        self.reset_features()
+
+    @property
+    def board(self):
+        """
+        The board as a list of rows of colour names, as held by Gameboard.
+        Built on request, intended for rendering only.
+        """
+        return [self.row_images(row) for row in range(len(self.rows))]
+
+    def row_masks(self):
+        """
+        One bitmask per row, bit n set when column n is occupied.
+        The list is the board's own and must not be modified.
+        """
+        return self.rows
+
+    def row_mask(self, row):
+        """
+        Bitmask of row, bit n set when column n is occupied.
+        """
+        return self.rows[row]
+
+    def row_images(self, row):
+        """
+        The image of each cell in row, None for empty cells.
+        """
+        width = self.WIDTH
+        return [COLOURS[code]
+                for code in self.cells[row * width:(row + 1) * width]]
+
+    def set_row(self, row, images):
+        """
+        Replace the contents of row with images, None for empty cells.
+        The board features are left for the caller to reset.
+        """
+        codes = [COLOUR_CODES[image] for image in images]
+        self.rows[row] = sum(1 << column for column, code in enumerate(codes)
+                             if code)
+        self.cells[row * self.WIDTH:(row + 1) * self.WIDTH] = bytes(codes)
+        self.version += 1
+
+    def occupied(self, row, column):
+        """
+        Checks if a single cell is occupied.
+        """
+        return self.rows[row] >> column & 1 == 1
+
+    def collision_occured(self, tetro):
+        """
+        Checks if co-ordinate is already occupied.
+        Blocks outside the board always collide.
+        """
+        rows = self.rows
+        entry = tetro.table_entry()
+        row, col = tetro.temp_position
+        min_row, min_col, max_row, max_col = entry.bounds
+        if (row + min_row < 0 or row + max_row >= len(rows) or
+                col + min_col < 0 or col + max_col >= self.WIDTH):
+            return True
+        col += min_col
+        for row_mask in entry.row_masks:
+            if rows[row + row_mask[0]] & row_mask[1] << col:
+                return True
+        return False
+
+    def update_section(self, tetro):
+        '''
+        Sets the values of a section of the game board
+        with the data held in tetro
+        '''
+        code = COLOUR_CODES[tetro.image]
+        entry = tetro.table_entry()
+        blocks = tetro.absolute_position()
+        self.lock_features(blocks)
+        row, col = tetro.temp_position
+        col += entry.bounds[1]
+        for row_mask in entry.row_masks:
+            self.rows[row + row_mask[0]] |= row_mask[1] << col
+        for block in blocks:
+            self.cells[block[0] * self.WIDTH + block[1]] = code
+        self.version += 1
+
+    def row_complete(self, row):
+        """
+        Checks row on board for free space to see if its complete.
+        """
+        return self.rows[row] == self.FULL_ROW
+
+    def remove_row(self, row):
+        """
+        Remove row from the board.
+        Rows below move up one index, as with Gameboard.remove_row.
+        """
+        self.remove_row_features(row)
+        width = self.WIDTH
+        height = len(self.rows)
+        self.cells[row * width:(height - 1) * width] = \
+            self.cells[(row + 1) * width:height * width]
+        self.rows.pop(row)
+        self.version += 1
+
+    def clear_lines(self, rows):
+        """
+        Remove the complete rows among rows, which must be distinct, in one
+        pass, moving the rows above them down and creating empty rows at
+        the top. The rows between cleared rows move as whole runs.
+        Returns the indices of the rows removed in ascending order.
+        """
+        cleared = [row for row in rows if self.rows[row] == self.FULL_ROW]
+        if not cleared:
+            return cleared
+        cleared.sort()
+        self.clear_lines_features(cleared)
+        width = self.WIDTH
+        count = len(cleared)
+        first = cleared[0]
+        lowest = cleared[-1]
+        if lowest - first == count - 1:
+            self.cells[count * width:(lowest + 1) * width] = \
+                self.cells[:first * width]
+            self.cells[:count * width] = bytes(count * width)
+            del self.rows[first:lowest + 1]
+        else:
+            cells = [bytes(count * width)]
+            start = 0
+            for row in cleared:
+                cells.append(self.cells[start * width:row * width])
+                start = row + 1
+            self.cells[:(lowest + 1) * width] = b''.join(cells)
+            for row in reversed(cleared):
+                del self.rows[row]
+        self.rows[0:0] = [0] * count
+        self.version += 1
+        return cleared
+
+    def create_row(self):
+        """
+        Creates a new row at the top of the board
+        """
+        width = self.WIDTH
+        height = len(self.rows)
+        self.cells[width:(height + 1) * width] = \
+            self.cells[0:height * width]
+        self.cells[0:width] = bytes(width)
+        self.create_rows_features()
+        self.rows.insert(0, 0)
+        self.version += 1
+
+    def insert_garbage(self, count, gap, image='grey'):
+        """
+        Push every row up count rows and fill the space above the bottom
+        row with rows of image, empty only in column gap.
+        The top count rows must be empty.
+        """
+        mask = self.FULL_ROW & ~(1 << gap)
+        self.insert_garbage_features(count, mask)
+        width = self.WIDTH
+        bottom = len(self.rows) - 1
+        self.cells[0:(bottom - count) * width] = \
+            self.cells[count * width:bottom * width]
+        row = bytearray([COLOUR_CODES[image]]) * width
+        row[gap] = COLOUR_CODES[None]
+        self.cells[(bottom - count) * width:bottom * width] = row * count
+        del self.rows[:count]
+        self.rows[-1:-1] = [mask] * count
+        self.version += 1
+
+    def resize_board(self):
+        """
+        Return board to full dimension.
+        Missing rows are created in one shift of the colour plane.
+        """
+        width = self.WIDTH
+        current_height = len(self.rows)
+        missing = self.HEIGHT - current_height
+        if missing > 0:
+            self.cells[missing * width:] = \
+                self.cells[0:current_height * width]
+            self.cells[0:missing * width] = bytes(missing * width)
+            self.create_rows_features(missing)
+            self.rows[0:0] = [0] * missing
+            self.version += 1
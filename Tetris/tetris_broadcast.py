@@ -0,0 +1,396 @@
+import asyncio
+import struct
+import sys
+import threading
+import tetris_bitboard as bitboard
+import tetris_replay as replay
+import tetris_tetrominos as tetro
+
+# Every frame starts with this header, after a two byte length.
+# A keyframe follows it with the variant's pieces, as written by
+# tetris_replay.encode_bag, and every row of the board but the bottom one.
+# A delta follows it with only the rows changed since the previous frame.
+# Rows are their index then their colour codes, two cells per byte.
+KEYFRAME = 0
+DELTA = 1
+FRAME_HEADER = struct.Struct('<BBBIQIHBBbbB?B')
+FRAME_SIZE = struct.Struct('<H')
+
+# Frames a viewer may fall behind by before its queue is dropped.
+QUEUE_SIZE = 8
+
+# Bytes buffered on a viewer's socket before it counts as falling behind.
+WRITE_BUFFER = 4096
+
+
+def pack_row(images):
+    """
+    The colour codes of a row of images, two cells per byte.
+    """
+    codes = [bitboard.COLOUR_CODES[image] for image in images]
+    if len(codes) % 2:
+        codes.append(0)
+    return bytes(codes[index] << 4 | codes[index + 1]
+                 for index in range(0, len(codes), 2))
+
+
+def unpack_row(packed, width):
+    """
+    The images of a row packed by pack_row.
+    """
+    images = []
+    for byte in packed:
+        images.append(bitboard.COLOURS[byte >> 4])
+        images.append(bitboard.COLOURS[byte & 0xf])
+    return images[:width]
+
+
+def frame(body):
+    """
+    A frame body preceded by its size, for sending over a stream.
+    """
+    return FRAME_SIZE.pack(len(body)) + body
+
+
+class FrameEncoder(object):
+    """
+    Turns successive states of an engine into frame bodies, deltas holding
+    the rows changed since the last update or keyframes holding them all.
+    """
+
+    def __init__(self):
+        self.board = None
+        self.version = None
+        self.rows = []
+        self.header = None
+        self.state = None
+        self.pieces = b''
+
+    def update(self, engine):
+        """
+        The delta from the last update to the current state of engine,
+        None when only the tick count has changed.
+        """
+        board = engine.board
+        changed = []
+        if board is not self.board or board.version != self.version:
+            if board is not self.board:
+                self.board = board
+                self.rows = [None] * (board.HEIGHT - 1)
+                self.pieces = replay.encode_bag(engine.variant.shapes)
+            self.version = board.version
+            for row in range(board.HEIGHT - 1):
+                packed = pack_row(board.row_images(row))
+                if packed != self.rows[row]:
+                    self.rows[row] = packed
+                    changed.append(row)
+
+        current = engine.tetro_current
+        state = (engine.score,
+                 engine.lines,
+                 engine.level,
+                 tetro.NAMES.index(current.name),
+                 current.rotation,
+                 current.position[0],
+                 current.position[1],
+                 tetro.NAMES.index(engine.tetro_next.name),
+                 engine.game_over)
+        if state == self.state and not changed:
+            return None
+        self.state = state
+        self.header = (board.HEIGHT, board.WIDTH, engine.ticks) + state
+        return self.body(DELTA, changed)
+
+    def keyframe(self):
+        """
+        A keyframe of the state at the last update.
+        """
+        return self.body(KEYFRAME, range(len(self.rows)), self.pieces)
+
+    def body(self, kind, rows, pieces=b''):
+        """
+        A frame body of kind holding rows.
+        """
+        return (FRAME_HEADER.pack(kind, *self.header + (len(rows),)) +
+                pieces +
+                b''.join(bytes([row]) + self.rows[row] for row in rows))
+
+
+class Feed(object):
+    """
+    The frames waiting to be sent to one viewer.
+    """
+
+    def __init__(self, size):
+        self.queue = asyncio.Queue(size)
+        self.dropped = 0
+        self.task = None
+        # Set until the viewer has been sent a keyframe, deltas are useless
+        # to it before then.
+        self.needs_keyframe = True
+
+
+class Broadcaster(object):
+    """
+    Streams a game to any number of viewers over a local socket.
+
+    publish() is called by the game after each logic tick. It compares the
+    game with the previous frame and hands the changes to the event loop,
+    which queues them for every viewer. Each viewer is written to by its
+    own task, so a slow viewer only ever delays itself. Once a viewer has
+    QUEUE_SIZE frames waiting they are dropped and replaced by a keyframe,
+    so the game never waits for a viewer. Keyframes are only built, by
+    the event loop, when a viewer joining or falling behind needs one.
+
+    The event loop can be the caller's, by awaiting start(), or one run on
+    a background thread by start_thread() for the pygame game loop.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, queue_size=QUEUE_SIZE):
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.address = None
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.feeds = set()
+
+        # The game as last published, kept by the publishing thread.
+        self.encoder = FrameEncoder()
+
+        # The header, rows and pieces of the game as last published, and
+        # the keyframe of them once built, kept by the event loop.
+        self.published = None
+        self.latest_keyframe = None
+
+    async def start(self):
+        """
+        Listen for viewers on the running event loop.
+        Returns the (host, port) listened on.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self.connect,
+                                                 self.host, self.port)
+        self.address = self.server.sockets[0].getsockname()[:2]
+        return self.address
+
+    def start_thread(self):
+        """
+        Listen for viewers on an event loop run by a background thread.
+        Returns the (host, port) listened on.
+        """
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            started.set()
+            loop.run_forever()
+            loop.close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait()
+        return self.address
+
+    async def stop(self):
+        """
+        Stop listening and disconnect every viewer.
+        """
+        self.server.close()
+        await self.server.wait_closed()
+        for feed in list(self.feeds):
+            feed.task.cancel()
+
+    def close(self):
+        """
+        Stop a broadcaster started by start_thread.
+        """
+        if self.thread is not None:
+            asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
+
+    async def connect(self, reader, writer):
+        """
+        Send frames to a newly connected viewer until it disconnects.
+        """
+        writer.transport.set_write_buffer_limits(WRITE_BUFFER)
+        feed = Feed(self.queue_size)
+        feed.task = asyncio.current_task()
+        if self.published is not None:
+            feed.queue.put_nowait(self.keyframe())
+            feed.needs_keyframe = False
+        self.feeds.add(feed)
+        try:
+            while True:
+                frame = await feed.queue.get()
+                writer.write(frame)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.feeds.discard(feed)
+            writer.close()
+
+    def keyframe(self):
+        """
+        A keyframe of the game as last published, built at most once per
+        publish, in the event loop.
+        """
+        if self.latest_keyframe is None:
+            encoder = FrameEncoder()
+            encoder.header, encoder.rows, encoder.pieces = self.published
+            self.latest_keyframe = frame(encoder.keyframe())
+        return self.latest_keyframe
+
+    def send(self, delta, published):
+        """
+        Queue a frame for every viewer, in the event loop.
+        Viewers that have not had a keyframe yet are sent one instead.
+        """
+        self.published = published
+        self.latest_keyframe = None
+        for feed in self.feeds:
+            if feed.queue.full():
+                # The viewer is too far behind, so skip it to the present.
+                feed.dropped += feed.queue.qsize()
+                while not feed.queue.empty():
+                    feed.queue.get_nowait()
+                feed.needs_keyframe = True
+            if feed.needs_keyframe:
+                feed.queue.put_nowait(self.keyframe())
+                feed.needs_keyframe = False
+            else:
+                feed.queue.put_nowait(delta)
+
+    def publish(self, engine):
+        """
+        Send the changes to a tetris_engine.Engine since the last call.
+        Nothing is sent when only the tick count has changed.
+        The rows are handed over as a tuple of the encoder's packed rows,
+        which are never modified, so building a keyframe from them costs
+        the game nothing.
+        """
+        delta = self.encoder.update(engine)
+        if delta is not None:
+            encoder = self.encoder
+            self.loop.call_soon_threadsafe(
+                self.send, frame(delta),
+                (encoder.header, tuple(encoder.rows), encoder.pieces))
+
+
+class Viewer(object):
+    """
+    A broadcast game rebuilt from its frames, with the attributes
+    tetris_interface.Interface draws from.
+    """
+
+    def __init__(self):
+        self.board = None
+        self.shapes = None
+        self.tetro_current = None
+        self.tetro_next = None
+        self.ticks = 0
+        self.score = 0
+        self.lines = 0
+        self.level = 1
+        self.game_over = False
+        self.frames = 0
+
+    def apply(self, frame):
+        """
+        Update the game from the body of one frame.
+        Deltas arriving before the first keyframe are ignored.
+        """
+        (kind, height, width, self.ticks, self.score, self.lines,
+         self.level, current, rotation, row, col, following, game_over,
+         row_count) = FRAME_HEADER.unpack_from(frame)
+        offset = FRAME_HEADER.size
+        if kind == KEYFRAME:
+            size = frame[offset]
+            self.shapes = [tetro.NAMES[index]
+                           for index in frame[offset + 1:offset + 1 + size]]
+            offset += 1 + size
+            if (self.board is None or
+                    (self.board.HEIGHT, self.board.WIDTH) != (height, width)):
+                self.board = bitboard.Bitboard(height, width)
+        elif self.board is None:
+            return
+        self.game_over = game_over
+
+        packed_size = (width + 1) // 2
+        for index in range(row_count):
+            board_row = frame[offset]
+            self.board.set_row(board_row, unpack_row(
+                frame[offset + 1:offset + 1 + packed_size], width))
+            offset += 1 + packed_size
+        if row_count:
+            self.board.reset_features()
+
+        name = tetro.NAMES[current]
+        if self.tetro_current is None or self.tetro_current.name != name:
+            self.tetro_current = tetro.create(name, width)
+        self.tetro_current.rotation = rotation
+        self.tetro_current.position[:] = [row, col]
+        self.tetro_current.clear_temp_position_shape()
+        name = tetro.NAMES[following]
+        if self.tetro_next is None or self.tetro_next.name != name:
+            self.tetro_next = tetro.create(name, width)
+        self.frames += 1
+
+    async def receive(self, reader):
+        """
+        Apply frames from reader until the broadcast ends.
+        """
+        try:
+            while True:
+                size, = FRAME_SIZE.unpack(await reader.readexactly(2))
+                self.apply(await reader.readexactly(size))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+
+async def watch(host, port, frame_rate=60):
+    """
+    Show a broadcast game in a window drawn by tetris_interface.Interface,
+    until the broadcast ends or the window is closed.
+    """
+    import pygame
+    import tetris_interface as interface
+
+    interface.init()
+    viewer = Viewer()
+    reader, writer = await asyncio.open_connection(host, port)
+    receiving = asyncio.ensure_future(viewer.receive(reader))
+    display = None
+    drawn = 0
+    while not receiving.done():
+        if any(event.type == pygame.QUIT for event in pygame.event.get()):
+            break
+        if viewer.frames != drawn and viewer.board is not None:
+            drawn = viewer.frames
+            board = viewer.board
+            if display is None:
+                display = interface.Interface(
+                    board.WIDTH, board.HEIGHT - 1 - board.HIDDEN_ROWS,
+                    tetro.preview_size(viewer.shapes))
+            display.update_display(board, viewer.tetro_current,
+                                   viewer.tetro_next, viewer, viewer.lines)
+            if viewer.game_over:
+                display.display_game_over()
+        await asyncio.sleep(1.0 / frame_rate)
+    receiving.cancel()
+    writer.close()
+
+
+if __name__ == "__main__":
+    host = "127.0.0.1"
+    if len(sys.argv) > 2:
+        host = sys.argv[1]
+    asyncio.run(watch(host, int(sys.argv[-1])))
+    import pygame
+    pygame.quit()
@@ -0,0 +1,455 @@
+import collections
+import struct
+import tetris_tetrominos as tetro
+import tetris_gameboard as gameboard
+import tetris_bitboard as bitboard
+import tetris_randomizer as randomizer_module
+import tetris_zobrist as zobrist
+
+# Gameboy version scoring system, points per number of lines cleared.
+# Five lines can only be cleared with pentominos.
+POINTS = {1: 40,
+          2: 100,
+          3: 300,
+          4: 1200,
+          5: 1500}
+
+# drop moves the tetromino straight down as far as it goes and locks it.
+ACTIONS = ("rotate", "move_l", "move_r", "move_d", "drop")
+
+# Board size and the pieces drawn in each bag.
+Variant = collections.namedtuple('Variant', ['height', 'width', 'shapes'])
+STANDARD = Variant(23, 10, tuple(tetro.SHAPES))
+VARIANTS = {'standard': STANDARD,
+            'wide': Variant(23, 16, tuple(tetro.SHAPES)),
+            'pentominos': Variant(23, 12, tuple(tetro.PENTOMINOS))}
+
+# Origin column range of every piece rotation, by board width.
+COLUMN_LIMITS = {}
+
+State = collections.namedtuple('State', ['board',
+                                         'tetro_current',
+                                         'tetro_next',
+                                         'score',
+                                         'lines',
+                                         'level',
+                                         'lines_cleared',
+                                         'locked',
+                                         'game_over'])
+
+# A snapshot is this header followed by the bag, one tetro.NAMES index
+# per byte, and the colour codes of the stacked rows, two cells per byte.
+# Stacked rows run from the highest occupied row down to the bottom row,
+# which is not stored.
+SNAPSHOT_MAGIC = b'TTS\x01'
+SNAPSHOT_HEADER = struct.Struct('<4sBBHIQQH?BBbbBBB')
+
+
+def score_lines(lines, level):
+    """
+    Points awarded for clearing lines at level.
+    """
+    return POINTS[lines] * level
+
+
+def column_limits(width):
+    """
+    The lowest and highest origin column keeping each rotation of each
+    piece on a board width columns wide, keyed by (name, rotation).
+    Built once per width.
+    """
+    limits = COLUMN_LIMITS.get(width)
+    if limits is None:
+        limits = {key: (-entry.bounds[1], width - 1 - entry.bounds[3])
+                  for key, entry in tetro.SHAPE_TABLE.items()}
+        COLUMN_LIMITS[width] = limits
+    return limits
+
+
+class Engine(object):
+    """
+    The rules of Tetris without any display or input handling.
+    Never imports pygame so it can run on headless machines.
+    """
+
+    def __init__(self, board_class=gameboard.Gameboard, seed=None,
+                 variant=STANDARD,
+                 randomizer_class=randomizer_module.BagRandomizer):
+        """
+        board_class selects the board backend, either
+        tetris_gameboard.Gameboard or tetris_bitboard.Bitboard.
+        variant sets the board size and pieces, one of VARIANTS or any
+        other Variant.
+        randomizer_class deals the pieces, one of
+        tetris_randomizer.RANDOMIZERS or any other Randomizer.
+        """
+        self.board_class = board_class
+        self.variant = variant
+        self.randomizer_class = randomizer_class
+        self.column_limits = column_limits(variant.width)
+        self.DROP_RATE = 60
+
+        # Called with each new bag, and bags to use before generating more.
+        self.on_new_bag = None
+        self.bag_queue = collections.deque()
+
+        # A tetris_stats.Stats to count moves, collisions and locks in.
+        self.stats = None
+
+        # landing_row() of the board version and tetromino state in
+        # landing_key.
+        self.landing_key = None
+        self.landing = None
+
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """
+        Start a new game. The same seed always gives the same game.
+        A seed of None seeds from the operating system.
+        """
+        self.randomizer = self.randomizer_class(self.variant.shapes, seed)
+
+        self.tetro_set = self.new_tetro_set()
+        self.tetro_current = self.new_tetro(self.tetro_set.pop())
+        self.tetro_next = self.new_tetro(self.tetro_set.pop())
+
+        self.board = self.board_class(self.variant.height, self.variant.width)
+
+        self.level = 1
+        self.lines = 0
+        self.score = 0
+        self.game_over = False
+        self.drop_counter = 0
+        self.ticks = 0
+        # Rows removed by the last lock, indices from before the removal.
+        self.cleared_rows = []
+        return self.state()
+
+    def state(self, lines_cleared=0, locked=False):
+        """
+        Snapshot of the game after the last step.
+        The board and tetrominos are shared, not copied.
+        """
+        return State(self.board,
+                     self.tetro_current,
+                     self.tetro_next,
+                     self.score,
+                     self.lines,
+                     self.level,
+                     lines_cleared,
+                     locked,
+                     self.game_over)
+
+    def zobrist(self):
+        """
+        64 bit hash of the occupied cells of the board and the position
+        and rotation of tetro_current.
+        """
+        current = self.tetro_current
+        return self.board.zobrist ^ zobrist.piece_key(current.name,
+                                                      current.rotation,
+                                                      current.position[0],
+                                                      current.position[1])
+
+    def snapshot(self):
+        """
+        The game state as compact bytes for restore.
+        Holds the board, tetrominos, bag, level, lines, score and timing
+        but not the randomizer or bag_queue.
+        """
+        board = self.board
+        width = board.WIDTH
+        bottom = board.HEIGHT - 1
+        stack = max(board.column_heights)
+        codes = bytearray()
+        for row in range(bottom - stack, bottom):
+            codes.extend(bitboard.COLOUR_CODES[image]
+                         for image in board.row_images(row))
+        if len(codes) % 2:
+            codes.append(0)
+        current = self.tetro_current
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC,
+                                      board.HEIGHT,
+                                      width,
+                                      self.level,
+                                      self.lines,
+                                      self.score,
+                                      self.ticks,
+                                      self.drop_counter,
+                                      self.game_over,
+                                      tetro.NAMES.index(current.name),
+                                      current.rotation,
+                                      current.position[0],
+                                      current.position[1],
+                                      tetro.NAMES.index(self.tetro_next.name),
+                                      len(self.tetro_set),
+                                      stack)
+        bag = bytes(tetro.NAMES.index(name) for name in self.tetro_set)
+        return header + bag + bytes(codes[index] << 4 | codes[index + 1]
+                                    for index in range(0, len(codes), 2))
+
+    def restore(self, snapshot):
+        """
+        Return the game to a state taken by snapshot.
+        The randomizer carries on from its current state.
+        """
+        if snapshot[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError("not a snapshot")
+        (magic, height, width, level, lines, score, ticks, drop_counter,
+         game_over, current, rotation, row, col, following, bag_size,
+         stack) = SNAPSHOT_HEADER.unpack_from(snapshot)
+        if (height, width) != (self.variant.height, self.variant.width):
+            raise ValueError("snapshot of a {}x{} board".format(width, height))
+        board = self.board_class(height, width)
+
+        offset = SNAPSHOT_HEADER.size
+        self.tetro_set = [tetro.NAMES[index]
+                          for index in snapshot[offset:offset + bag_size]]
+        offset += bag_size
+        codes = []
+        for byte in snapshot[offset:offset + (stack * width + 1) // 2]:
+            codes.append(byte >> 4)
+            codes.append(byte & 0xf)
+        bottom = height - 1
+        for index, board_row in enumerate(range(bottom - stack, bottom)):
+            row_codes = codes[index * width:(index + 1) * width]
+            board.set_row(board_row,
+                          [bitboard.COLOURS[code] for code in row_codes])
+        board.reset_features()
+        self.board = board
+
+        self.tetro_current = self.new_tetro(tetro.NAMES[current])
+        self.tetro_current.rotation = rotation
+        self.tetro_current.position[:] = [row, col]
+        self.tetro_current.clear_temp_position_shape()
+        self.tetro_next = self.new_tetro(tetro.NAMES[following])
+
+        self.level = level
+        self.lines = lines
+        self.score = score
+        self.ticks = ticks
+        self.drop_counter = drop_counter
+        self.game_over = game_over
+        self.cleared_rows = []
+        return self.state()
+
+    def copy(self):
+        """
+        An independent Engine in the same state, randomizer included.
+        """
+        clone = Engine(self.board_class, variant=self.variant,
+                       randomizer_class=self.randomizer_class)
+        clone.restore(self.snapshot())
+        clone.randomizer = self.randomizer.copy()
+        return clone
+
+    def new_tetro(self, name):
+        """
+        A new piece of shape name at the spawn position.
+        """
+        return tetro.create(name, self.variant.width)
+
+    def new_tetro_set(self):
+        """
+        The next set of pieces dealt by the randomizer, with one of every
+        piece of the variant for the default BagRandomizer.
+        Bags waiting in bag_queue are used first.
+        """
+        if self.bag_queue:
+            tetro_set = list(self.bag_queue.popleft())
+        else:
+            tetro_set = self.randomizer.new_bag()
+        if self.on_new_bag is not None:
+            self.on_new_bag(tetro_set)
+        return tetro_set
+
+    def new_tetros(self):
+        """
+        Move tetro_next into tetro_current and update tetro_next.
+        The game is over if tetro_current has nowhere to spawn.
+        """
+        if not self.tetro_set:
+            self.tetro_set = self.new_tetro_set()
+        self.tetro_current = self.tetro_next
+        self.tetro_next = self.new_tetro(self.tetro_set.pop())
+        if self.stats is not None:
+            self.stats.collision_checks += 1
+        if self.board.collision_occured(self.tetro_current):
+            self.game_over = True
+
+    def add_garbage(self, count, gap):
+        """
+        Push count garbage rows, full but for column gap, up from the
+        bottom of the board.
+        The game is over if the stack would be pushed off the top or into
+        tetro_current.
+        """
+        board = self.board
+        if max(board.column_heights) + count > board.HEIGHT - 1:
+            self.game_over = True
+            return
+        board.insert_garbage(count, gap)
+        if board.collision_occured(self.tetro_current):
+            self.game_over = True
+
+    def landing_row(self):
+        """
+        Origin row tetro_current comes to rest at if dropped straight down.
+        Found from the column heights of the board and the lowest block of
+        the tetromino in each of its columns, and cached until either
+        changes. Stepping down a row at a time is only needed when the
+        tetromino is below the top of a column it covers, such as when
+        tucked under an overhang.
+        """
+        board = self.board
+        current = self.tetro_current
+        row, col = current.position
+        key = (board, board.version, current.name, current.rotation, row, col)
+        if key == self.landing_key:
+            return self.landing
+
+        heights = board.column_heights
+        surface = board.HEIGHT - 2
+        landing = min(surface - heights[col + column] - block_row
+                      for column, block_row in current.table_entry(
+                          temp=False).bottom)
+        if landing < row:
+            landing = row
+            temp = current.temp_position
+            temp[0] = row + 1
+            while not board.collision_occured(current):
+                landing += 1
+                temp[0] = landing + 1
+            temp[0] = row
+
+        self.landing_key = key
+        self.landing = landing
+        return landing
+
+    def hard_drop(self):
+        """
+        Move tetro_current to its landing row and lock it.
+        Returns the number of lines completed.
+        """
+        current = self.tetro_current
+        current.temp_position[0] = self.landing_row()
+        current.keep_temp_position_shape()
+        return self.fix_tetro_position()
+
+    def move_valid(self):
+        """
+        Checks to ensure tetro stays on board and doesn't overlap any
+        existing tetros.
+        """
+        def move_possible():
+            """
+            Checks move doesn't send tetromino off the gameboard.
+            """
+            current = self.tetro_current
+            low, high = self.column_limits[(current.name,
+                                            current.temp_rotation)]
+            return low <= current.temp_position[1] <= high
+
+        stats = self.stats
+        if stats is not None:
+            stats.moves_attempted += 1
+        if move_possible():
+            if stats is not None:
+                stats.collision_checks += 1
+            if not self.board.collision_occured(self.tetro_current):
+                return True
+        if stats is not None:
+            stats.moves_rejected += 1
+        return False
+
+    def fix_tetro_position(self):
+        """
+        Fix tetro_current to the board.
+        Remove complete lines in one pass, their indices are kept in
+        cleared_rows.
+        Update scores.
+        Returns the number of lines completed.
+        """
+        self.board.update_section(self.tetro_current)
+
+        # Remove complete lines
+        self.cleared_rows = self.board.clear_lines(
+            self.tetro_current.rows_occupied())
+        lines_complete = len(self.cleared_rows)
+
+        if self.stats is not None:
+            self.stats.pieces_locked += 1
+            self.stats.lines_cleared += lines_complete
+
+        # update scores
+        if lines_complete > 0:
+            self.lines += lines_complete
+            if self.lines % 10 == 0:
+                self.level += 1
+            self.update_score(lines_complete, self.level)
+        return lines_complete
+
+    def update_score(self, lines, level):
+        """
+        Updates the score based on the gameboy version scoring system.
+        """
+        self.score += score_lines(lines, level)
+
+    def step(self, action):
+        """
+        Apply one of ACTIONS to tetro_current and return the new State.
+        An action of None leaves the game unchanged.
+        A move_d that is blocked, or a drop, locks the tetromino and spawns
+        the next.
+        """
+        lines_cleared = 0
+        locked = False
+        if action == "drop" and not self.game_over:
+            lines_cleared = self.hard_drop()
+            self.new_tetros()
+            locked = True
+        elif action is not None and not self.game_over:
+            getattr(self.tetro_current, action)()
+
+            # Validate move
+            if self.move_valid():
+                self.tetro_current.keep_temp_position_shape()
+            else:
+                self.tetro_current.clear_temp_position_shape()
+
+                # Update game state
+                if action == "move_d":
+                    lines_cleared = self.fix_tetro_position()
+                    self.new_tetros()
+                    locked = True
+        return self.state(lines_cleared, locked)
+
+    def drop_tetro(self):
+        """
+        Determine if enough logic ticks have passed to drop the tetromino.
+        """
+        if self.drop_counter == 0:
+            self.drop_counter = self.DROP_RATE // self.level
+            return True
+        else:
+            self.drop_counter -= 1
+            return False
+
+    def tick(self, actions=()):
+        """
+        Advance the game by one logic tick, applying actions followed by
+        gravity. Actions after one that locks tetro_current are dropped.
+        Returns the State after the last action applied.
+        """
+        actions = list(actions)
+        if self.drop_tetro():
+            actions.append("move_d")
+        self.ticks += 1
+
+        state = self.state()
+        for action in actions:
+            state = self.step(action)
+            if state.locked:
+                break
+        return state
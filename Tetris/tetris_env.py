@@ -0,0 +1,154 @@
+import numpy as np
+import tetris_engine as engine
+import tetris_bitboard as bitboard
+
+# Action codes, as in tetris_batch: NOOP then tetris_engine.ACTIONS.
+ACTIONS = (None,) + engine.ACTIONS
+
+# Entries of the piece observation.
+PIECE = 0
+ROTATION = 1
+ROW = 2
+COL = 3
+NEXT_PIECE = 4
+
+
+class TetrisEnv(object):
+    """
+    A reset/step/render environment around tetris_engine.Engine.
+
+    Observations are a dict of
+        board  (HEIGHT, WIDTH) uint8 array of tetris_bitboard.COLOUR_CODES
+        piece  int64 array indexed by PIECE, ROTATION, ROW, COL, NEXT_PIECE,
+               pieces numbered by their index in the variant shapes
+    The board array is a view over the colour plane of the engine's
+    Bitboard, not a copy, so it always shows the current board and costs
+    nothing to produce. Both arrays are updated in place and stay the same
+    objects until the next reset. Copy them to keep an observation.
+    """
+
+    def __init__(self, seed=None, render_mode=None, max_steps=None,
+                 variant=engine.STANDARD):
+        """
+        render_mode "rgb_array" makes render() return the visible board as
+        a (rows, columns, 3) uint8 array. max_steps truncates long games.
+        variant sets the board size and pieces, as for Engine.
+        """
+        self.render_mode = render_mode
+        self.max_steps = max_steps
+        self.action_count = len(ACTIONS)
+        self.engine = engine.Engine(bitboard.Bitboard, seed, variant)
+        self.shapes = list(variant.shapes)
+        self.piece = np.zeros(5, dtype=np.int64)
+        self.observation = None
+        self.steps = 0
+
+        # Offscreen rendering, created on the first render().
+        self.images = None
+        self.surface = None
+        self.drawn_board = None
+        self.drawn_version = None
+        self.board_surface = None
+
+    def observe(self):
+        """
+        Update the piece observation in place and return the observation.
+        """
+        current = self.engine.tetro_current
+        self.piece[PIECE] = self.shapes.index(current.name)
+        self.piece[ROTATION] = current.rotation
+        self.piece[ROW] = current.position[0]
+        self.piece[COL] = current.position[1]
+        self.piece[NEXT_PIECE] = self.shapes.index(
+            self.engine.tetro_next.name)
+        return self.observation
+
+    def reset(self, seed=None):
+        """
+        Start a new game. Returns the observation and an info dict.
+        """
+        self.engine.reset(seed)
+        board = self.engine.board
+        self.observation = {
+            'board': np.frombuffer(board.cells, dtype=np.uint8).reshape(
+                board.HEIGHT, board.WIDTH),
+            'piece': self.piece}
+        self.steps = 0
+        return self.observe(), self.info()
+
+    def step(self, action):
+        """
+        Apply one action code.
+        Returns the observation, the points scored, whether the game is
+        over, whether it was cut short by max_steps and an info dict.
+        """
+        if self.observation is None:
+            raise RuntimeError("step() called before reset()")
+        score = self.engine.score
+        state = self.engine.step(ACTIONS[action])
+        self.steps += 1
+        truncated = (self.max_steps is not None and
+                     self.steps >= self.max_steps and not state.game_over)
+        return (self.observe(), state.score - score, state.game_over,
+                truncated, self.info(state))
+
+    def info(self, state=None):
+        """
+        Extra details of the last step.
+        """
+        if state is None:
+            state = self.engine.state()
+        return {'lines': state.lines,
+                'level': state.level,
+                'score': state.score,
+                'lines_cleared': state.lines_cleared,
+                'locked': state.locked}
+
+    def render(self):
+        """
+        The visible board with the in-play tetromino as an RGB array, drawn
+        on an offscreen surface with the tiles of tetris_interface.
+        Returns None unless render_mode is "rgb_array".
+        """
+        if self.render_mode != "rgb_array":
+            return None
+        import pygame
+        import tetris_interface as interface
+
+        board = self.engine.board
+        size = interface.BLOCK_SIZE
+        visible_rows = board.HEIGHT - 1 - board.HIDDEN_ROWS
+        if self.surface is None:
+            self.images = interface.load_images(convert=False)
+            self.surface = pygame.Surface((board.WIDTH * size,
+                                           visible_rows * size))
+            self.board_surface = self.surface.copy()
+
+        # Locked cells are redrawn only when the board has changed.
+        if (board is not self.drawn_board or
+                board.version != self.drawn_version):
+            self.drawn_board = board
+            self.drawn_version = board.version
+            for row in range(visible_rows):
+                images = board.row_images(row + board.HIDDEN_ROWS)
+                for column, image in enumerate(images):
+                    self.board_surface.blit(self.images[image or 'blank'],
+                                            (column * size, row * size))
+
+        self.surface.blit(self.board_surface, (0, 0))
+        current = self.engine.tetro_current
+        for row, column in current.absolute_position(temp=False):
+            row -= board.HIDDEN_ROWS
+            if row >= 0:
+                self.surface.blit(self.images[current.image],
+                                  (column * size, row * size))
+        return pygame.surfarray.array3d(self.surface).swapaxes(0, 1)
+
+    def close(self):
+        """
+        Release the offscreen surfaces.
+        """
+        self.images = None
+        self.surface = None
+        self.board_surface = None
+        self.drawn_board = None
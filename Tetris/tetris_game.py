@@ -1,91 +1,167 @@
-import pygame
-import random
-import tetris_tetrominos as tetro
-import tetris_player as player
-import tetris_gameboard as gameboard
-import tetris_interface as interface
+import sys
+import time
 
-pygame.init()
-random.seed()
+# Startup is timed from before pygame, numpy and the game modules are
+# imported.
+STARTED = time.perf_counter()
+
+import pygame  # noqa: E402
+import tetris_engine as engine  # noqa: E402
+import tetris_player as player_module  # noqa: E402
+import tetris_gameboard as gameboard  # noqa: E402
+import tetris_tetrominos as tetro  # noqa: E402
+import tetris_interface as interface  # noqa: E402
+import tetris_replay as replay  # noqa: E402
+import tetris_scheduler as scheduler  # noqa: E402
+import tetris_randomizer as randomizer_module  # noqa: E402
+import tetris_input as input_module  # noqa: E402
+# tetris_stats and tetris_broadcast are imported only where their options
+# are used, as they pull in http.server and asyncio.
+
+# Seconds to block waiting for input while paused or on game over.
+IDLE_TIMEOUT = 0.25
+
+# Logic ticks between writes of the stats file.
+STATS_INTERVAL = 60
 
 
 class Tetris_Game(object):
     """
     Manages all tetris objects and their interactions to produce a playable
     game of Tetris.
+    The rules live in tetris_engine.Engine, this class adds the display,
+    player input and timing.
     """
 
-    def __init__(self):
+    def __init__(self, board_class=gameboard.Gameboard, seed=None,
+                 replay_path=None, player=None, variant=engine.STANDARD,
+                 stats=None, stats_path=None, broadcaster=None,
+                 randomizer_class=randomizer_module.BagRandomizer):
+        """
+        board_class selects the board backend, either
+        tetris_gameboard.Gameboard or tetris_bitboard.Bitboard.
+        If replay_path is given the game is recorded there.
+        player defaults to a keyboard tetris_player.Player.
+        variant sets the board size and pieces, one of
+        tetris_engine.VARIANTS or any other tetris_engine.Variant.
+        stats is an optional tetris_stats.Stats to instrument the game
+        with. If stats_path is given the report is written there every
+        STATS_INTERVAL ticks and when the game ends.
+        broadcaster is an optional started tetris_broadcast.Broadcaster to
+        publish the game to after every tick.
+        randomizer_class deals the pieces, seeded by seed, one of
+        tetris_randomizer.RANDOMIZERS or any other Randomizer.
+        """
+        if stats is None and stats_path is not None:
+            import tetris_stats as stats_module
+            stats = stats_module.Stats()
+        self.engine = engine.Engine(board_class, seed, variant,
+                                    randomizer_class)
+        self.stats = stats
+        self.stats_path = stats_path
+        self.engine.stats = stats
+        self.broadcaster = broadcaster
+        self.recorder = None
+        if replay_path is not None:
+            self.recorder = replay.Recorder(open(replay_path, 'wb'),
+                                            self.engine, seed)
 
-        self.tetro_set = self.new_tetro_set()
-        self.tetro_current = getattr(tetro, self.tetro_set.pop())()
-        self.tetro_next = getattr(tetro, self.tetro_set.pop())()
+        # Only the display and fonts are used, so only they are started.
+        interface.init()
+        if player is None:
+            player = player_module.Player()
+        self.player = player
+        self.player.bind(self.engine)
 
-        self.board = gameboard.Gameboard()
+        self.interface = interface.Interface(
+            variant.width, variant.height - 1 - self.board.HIDDEN_ROWS,
+            tetro.preview_size(variant.shapes))
 
-        self.player = player.Player()
+        # (time, input) pairs polled but not yet taken by a tick.
+        self.moves = []
+        # Times of the actions applied since the last frame was shown.
+        self.applied = []
+        self.scheduler = scheduler.Scheduler(self.tick,
+                                             render=self.render,
+                                             present=self.present,
+                                             poll_input=self.poll_input,
+                                             tick_rate=60,
+                                             render_rate=60,
+                                             stats=stats,
+                                             wait_input=self.player.wait)
+        self.play = True
 
-        self.interface = interface.Interface()
+        # Seconds from loading this module to the first frame shown.
+        self.first_frame = None
 
-        self.level = 1
-        self.lines = 0
+    @property
+    def board(self):
+        """
+        The engine gameboard.
+        """
+        return self.engine.board
 
-        self.DROP_RATE = 60
-        self.drop_counter = 0
-        self.clock = pygame.time.Clock()
-        self.play = True
+    @property
+    def tetro_current(self):
+        """
+        The in-play tetromino.
+        """
+        return self.engine.tetro_current
 
-    def new_tetro_set(self):
+    @property
+    def tetro_next(self):
         """
-        Create a randomised list with one of every tetromino.
+        The next tetromino.
         """
-        tetro_set = list(tetro.SHAPES)
-        random.shuffle(tetro_set)
-        return tetro_set
+        return self.engine.tetro_next
 
-    def new_tetros(self):
+    @property
+    def level(self):
         """
-        Move tetro_next into tetro_current and update tetro_next.
+        The current level.
         """
+        return self.engine.level
 
-        def game_over():
-            """
-            Determine whether player has quit.
-            """
-            quit = False
-            self.interface.display_game_over()
-            while not quit:
-                inputs = self.player.get_input()
-                for input in inputs:
-                    if input == 'quit':
-                        self.play = False
-                        quit = True
+    @property
+    def lines(self):
+        """
+        The number of completed lines.
+        """
+        return self.engine.lines
 
-        if not self.tetro_set:
-            self.tetro_set = self.new_tetro_set()
-        self.tetro_current = self.tetro_next
-        self.tetro_next = getattr(tetro, self.tetro_set.pop())()
-        if self.board.collision_occured(self.tetro_current):
-            game_over()
+    def snapshot(self):
+        """
+        The game state as compact bytes, see tetris_engine.Engine.snapshot.
+        """
+        return self.engine.snapshot()
 
-    def drop_tetro(self):
+    def restore(self, snapshot):
         """
-        Determine if enough clock ticks have passed to drop the tetromino.
+        Return the game to a state taken by snapshot.
         """
-        if self.drop_counter == 0:
-            self.drop_counter = self.DROP_RATE // self.level
-            return True
-        else:
-            self.drop_counter -= 1
-            return False
+        self.engine.restore(snapshot)
+        self.player.score = self.engine.score
+
+    def game_over(self):
+        """
+        Wait until the player quits, blocking on input while idle.
+        """
+        quit = False
+        self.interface.display_game_over()
+        while not quit:
+            inputs = self.player.wait_input(IDLE_TIMEOUT)
+            for input in inputs:
+                if input == 'quit':
+                    self.play = False
+                    quit = True
 
     def pause_game(self):
         """
-        Freeze the game state until unpaused.
+        Freeze the game state until unpaused, blocking on input while idle.
         """
         paused = True
         while paused:
-            inputs = self.player.get_input()
+            inputs = self.player.wait_input(IDLE_TIMEOUT)
             for input in inputs:
                 if input == 'quit':
                     self.play = False
@@ -93,94 +169,148 @@ class Tetris_Game(object):
                 if input == 'pause':
                     paused = not paused
 
-    def calculate_move(self, input):
+    def poll_input(self):
         """
-        Update temp_position of tetromino based on input.
+        Queue timestamped player inputs for the logic ticks they fall in.
         """
-        getattr(self.tetro_current, input)()
+        self.moves.extend(self.player.poll())
 
-    def move_valid(self):
+    def tick(self):
         """
-        Checks to ensure tetro stays on board and doesn't overlap any
-        existing tetros.
+        Advance the game by one logic tick, taking the inputs timestamped
+        up to the time the tick stands for.
         """
-        def move_possible():
-            """
-            Checks move doesn't send tetromino off the gameboard.
-            """
-            for block_vector in self.tetro_current.absolute_position():
-                if block_vector[1] < 0 or block_vector[1] > 9:
-                    return False
-            return True
+        due = self.scheduler.tick_time
+        moves = [move for move in self.moves if move[0] <= due]
+        self.moves = [move for move in self.moves if move[0] > due]
+
+        # Handle inputs
+        actions = []
+        for stamp, move in moves:
+            if move == 'quit':
+                self.play = False
+            elif move == 'pause':
+                self.pause_game()
+                self.scheduler.resync()
+            else:
+                actions.append(move)
+                if self.stats is not None:
+                    self.applied.append(stamp)
 
-        if move_possible():
-            if not self.board.collision_occured(self.tetro_current):
-                return True
-        return False
+        if self.recorder is not None:
+            self.recorder.record_tick(self.engine.ticks, actions)
+        state = self.engine.tick(actions)
+        if self.broadcaster is not None:
+            self.broadcaster.publish(self.engine)
+        if state.locked:
+            self.player.score = state.score
+            if state.game_over:
+                self.game_over()
 
-    def fix_tetro_position(self):
+        if (self.stats_path is not None and
+                self.engine.ticks % STATS_INTERVAL == 0):
+            self.stats.dump(self.stats_path)
+
+        if not self.play:
+            self.scheduler.stop()
+
+    def render(self):
         """
-        Fix tetro_current to the board.
-        Remove complete lines.
-        Update scores.
+        Draw the current game state.
         """
-        self.board.update_section(self.tetro_current)
+        if self.stats is not None:
+            start = time.perf_counter()
+        self.interface.draw(self.board,
+                            self.tetro_current,
+                            self.tetro_next,
+                            self.player,
+                            self.lines,
+                            self.engine.landing_row())
+        if self.stats is not None:
+            self.stats.time("draw", time.perf_counter() - start)
 
-        # Remove complete lines
-        rows_occupied = self.tetro_current.rows_occupied()
-        lines_complete = 0
-        for row in rows_occupied:
-            if self.board.row_complete(row):
-                lines_complete += 1
-                self.board.remove_row(row)
-
-        # update scores
-        if lines_complete > 0:
-            self.board.resize_board()
-            self.lines += lines_complete
-            if self.lines % 10 == 0:
-                self.level += 1
-            self.player.update_score(lines_complete, self.level)
+    def present(self):
+        """
+        Show the drawn frame, noting when the first one appears.
+        """
+        if self.stats is not None:
+            start = time.perf_counter()
+        self.interface.present()
+        if self.stats is not None:
+            shown = time.perf_counter()
+            self.stats.time("present", shown - start)
+            for stamp in self.applied:
+                self.stats.input_latency.add(shown - stamp)
+            self.applied = []
+        if self.first_frame is None:
+            self.first_frame = time.perf_counter() - STARTED
 
     def game_start(self):
         """
         Game Loop.
         """
-        while self.play:
-            moves = self.player.get_input()
-            if self.drop_tetro():
-                moves.append('move_d')
-
-            # Handle inputs
-            for move in moves:
-                if move == 'quit':
-                    self.play = False
-                elif move == 'pause':
-                    self.pause_game()
-                else:
-                    self.calculate_move(move)
-
-                    # Validate move
-                    if self.move_valid():
-                        self.tetro_current.keep_temp_position_shape()
-                    else:
-                        self.tetro_current.clear_temp_position_shape()
-
-                        # Update game state
-                        if move == "move_d":
-                            self.fix_tetro_position()
-                            self.new_tetros()
-                            break
-
-            self.interface.update_display(self.board,
-                                          self.tetro_current,
-                                          self.tetro_next,
-                                          self.player,
-                                          self.lines)
-            self.clock.tick(60)
+        self.scheduler.run()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.stats_path is not None:
+            self.stats.dump(self.stats_path)
 
 
 if __name__ == "__main__":
-    game = Tetris_Game()
+    variant = engine.STANDARD
+    if "--variant" in sys.argv:
+        variant = engine.VARIANTS[sys.argv[sys.argv.index("--variant") + 1]]
+    seed = None
+    if "--seed" in sys.argv:
+        seed = int(sys.argv[sys.argv.index("--seed") + 1])
+    randomizer_class = randomizer_module.BagRandomizer
+    if "--randomizer" in sys.argv:
+        randomizer_class = randomizer_module.RANDOMIZERS[
+            sys.argv[sys.argv.index("--randomizer") + 1]]
+    das = input_module.DAS
+    if "--das" in sys.argv:
+        das = float(sys.argv[sys.argv.index("--das") + 1]) / 1000
+    arr = input_module.ARR
+    if "--arr" in sys.argv:
+        arr = float(sys.argv[sys.argv.index("--arr") + 1]) / 1000
+    player = player_module.Player(das, arr)
+    if "--ai" in sys.argv:
+        player = player_module.AIPlayer()
+    stats = stats_path = None
+    if "--stats" in sys.argv:
+        import tetris_stats as stats_module
+        stats = stats_module.Stats()
+        stats_path = sys.argv[sys.argv.index("--stats") + 1]
+    if "--report-latency" in sys.argv:
+        import tetris_stats as stats_module
+        stats = stats or stats_module.Stats()
+    if "--stats-port" in sys.argv:
+        import tetris_stats as stats_module
+        stats = stats or stats_module.Stats()
+        host, port = stats.serve(
+            int(sys.argv[sys.argv.index("--stats-port") + 1]))
+        sys.stderr.write("stats at http://{}:{}/\n".format(host, port))
+    broadcaster = None
+    if "--broadcast" in sys.argv:
+        import tetris_broadcast as broadcast
+        broadcaster = broadcast.Broadcaster(
+            port=int(sys.argv[sys.argv.index("--broadcast") + 1]))
+        host, port = broadcaster.start_thread()
+        sys.stderr.write("broadcasting on {}:{}\n".format(host, port))
+    game = Tetris_Game(seed=seed, player=player, variant=variant,
+                       stats=stats, stats_path=stats_path,
+                       broadcaster=broadcaster,
+                       randomizer_class=randomizer_class)
     game.game_start()
+    if broadcaster is not None:
+        broadcaster.close()
+    if "--report-startup" in sys.argv and game.first_frame is not None:
+        sys.stderr.write("first frame after {:.1f} ms\n".format(
+            game.first_frame * 1000))
+    if "--report-latency" in sys.argv:
+        latency = stats.input_latency.report()
+        sys.stderr.write(
+            "input to display over {count} inputs: p50 {p50_ms:.1f} ms, "
+            "p90 {p90_ms:.1f} ms, p99 {p99_ms:.1f} ms, "
+            "max {max_ms:.1f} ms\n".format(**latency))
     pygame.quit()
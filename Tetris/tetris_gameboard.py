@@ -1,4 +1,148 @@
-class Gameboard(object):
+import tetris_zobrist as zobrist
+
+
+class BoardFeatures(object):
+    '''
+    Per-row fill counts kept up to date as the board changes, and
+    per-column heights, a hole count and a hash computed when read.
+
+    row_fill[row] is the number of occupied cells in row.
+    column_heights[column] is the number of rows from the bottom row up to
+    the highest occupied cell of column, 0 for an empty column.
+    holes is the number of empty cells below the highest occupied cell of
+    their column.
+    zobrist is a 64 bit hash of which cells are occupied, the XOR of the
+    tetris_zobrist.row_key of every row above the bottom row. Rows are
+    keyed by their height above the bottom row, so creating rows at the
+    top leaves it unchanged.
+
+    Most locks and clears are never followed by a read of column_heights,
+    holes or zobrist, so rather than update them every time they are
+    counted from the row masks when read and kept until the board version
+    changes.
+
+    Boards call the update methods before changing their cells and provide
+    row_mask(row), row_masks() and a version incremented on every change.
+    '''
+
+    @property
+    def column_heights(self):
+        """
+        Height of each column, see the class docstring.
+        """
+        if self.counted_version != self.version:
+            self.count_stack()
+        return self.heights
+
+    @property
+    def holes(self):
+        """
+        Number of covered empty cells, see the class docstring.
+        """
+        if self.counted_version != self.version:
+            self.count_stack()
+        return self.hole_count
+
+    @property
+    def zobrist(self):
+        """
+        64 bit hash of the occupied cells, see the class docstring.
+        """
+        if self.hashed_version != self.version:
+            fill = self.row_fill
+            bottom = len(fill) - 1
+            hashed = 0
+            for row in range(bottom):
+                if fill[row]:
+                    hashed ^= zobrist.row_key(bottom - row,
+                                              self.row_mask(row))
+            self.hashed = hashed
+            self.hashed_version = self.version
+        return self.hashed
+
+    def count_stack(self):
+        """
+        Count column_heights and holes from the occupied rows.
+        """
+        fill = self.row_fill
+        bottom = len(fill) - 1
+        heights = [0] * self.WIDTH
+        holes = 0
+        covered = 0
+        for row in range(bottom):
+            if not fill[row]:
+                holes += bin(covered).count('1')
+                continue
+            mask = self.row_mask(row)
+            holes += bin(covered & ~mask).count('1')
+            new = mask & ~covered
+            while new:
+                low = new & -new
+                new ^= low
+                heights[low.bit_length() - 1] = bottom - row
+            covered |= mask
+        self.heights = heights
+        self.hole_count = holes
+        self.counted_version = self.version
+
+    def reset_features(self):
+        """
+        Recount every feature from the board contents.
+        Needed after cells are written directly.
+        """
+        self.row_fill = [bin(mask).count('1') for mask in self.row_masks()]
+        self.counted_version = None
+        self.hashed_version = None
+
+    def lock_features(self, blocks):
+        """
+        Count blocks, (row, column) pairs of empty cells about to be filled.
+        """
+        fill = self.row_fill
+        for row, column in blocks:
+            fill[row] += 1
+
+    def remove_row_features(self, row):
+        """
+        Uncount row, about to be removed.
+        """
+        self.row_fill.pop(row)
+
+    def clear_lines_features(self, cleared):
+        """
+        Uncount the full rows cleared, in ascending order, about to be
+        removed together with every row above them moving down.
+        """
+        fill = self.row_fill
+        count = len(cleared)
+        lowest = cleared[-1]
+        if lowest - cleared[0] == count - 1:
+            fill[:lowest + 1] = [0] * count + fill[:cleared[0]]
+            return
+        kept = [0] * count
+        start = 0
+        for row in cleared:
+            kept += fill[start:row]
+            start = row + 1
+        fill[:start] = kept
+
+    def create_rows_features(self, count=1):
+        """
+        Count count empty rows about to be created at the top.
+        """
+        self.row_fill[0:0] = [0] * count
+
+    def insert_garbage_features(self, count, mask):
+        """
+        Count count rows of mask about to be inserted above the bottom row,
+        pushing every row up. The top count rows must be empty.
+        """
+        fill = self.row_fill
+        del fill[:count]
+        fill[-1:-1] = [bin(mask).count('1')] * count
+
+
+class Gameboard(BoardFeatures):
     '''
     Holds info on the current board state
 
@@ -8,33 +152,39 @@ class Gameboard(object):
         BOTTOM
     '''
 
-    def __init__(self):
+    def __init__(self, height=23, width=10, hidden_rows=2):
         """
         Initialises the board to be a WIDTH x HEIGHT matrix.
         The first HEIGHT - 1 rows contain None values.
         The final row contains "bottom" for each value.
         """
-        self.HEIGHT = 23
-        self.HIDDEN_ROWS = 2
-        self.WIDTH = 10
+        self.HEIGHT = height
+        self.HIDDEN_ROWS = hidden_rows
+        self.WIDTH = width
 
         self.board = [[None for col in range(self.WIDTH)]
                       for row in range(self.HEIGHT - 1)]
         self.board.append(['bottom'] * self.WIDTH)
 
+        # Incremented whenever the contents of the board change.
+        self.version = 0
+        self.reset_features()
+
+    def occupied(self, row, column):
+        """
+        Checks if a single cell is occupied.
+        """
+        return self.board[row][column] is not None
+
     def collision_occured(self, tetro):
         """
         Checks if co-ordinate is already occupied.
+        Blocks above or below the board always collide.
         """
-        def get_section():
-            '''
-            Returns values found on board at each block co-ordinate.
-            '''
-            return [self.board[block[0]][block[1]]
-                    for block in tetro.absolute_position()]
-
-        for block in get_section():
-            if block is not None:
+        board = self.board
+        height = len(board)
+        for row, column in tetro.absolute_position():
+            if not 0 <= row < height or board[row][column] is not None:
                 return True
         return False
 
@@ -43,29 +193,105 @@ class Gameboard(object):
         Sets the values of a section of the game board
         with the data held in tetro
         '''
-        for block in tetro.absolute_position():
+        blocks = tetro.absolute_position()
+        self.lock_features(blocks)
+        for block in blocks:
             self.board[block[0]][block[1]] = tetro.image
+        self.version += 1
 
     def row_complete(self, row):
         """
-        Checks row on board for free space to see if its complete.
+        Checks the fill count of row to see if its complete.
         """
-        for column in range(self.WIDTH):
-            if self.board[row][column] is None:
-                return False
-        return True
+        return self.row_fill[row] == self.WIDTH
 
     def remove_row(self, row):
         """
         Remove row from the board.
         """
+        self.remove_row_features(row)
         self.board.pop(row)
+        self.version += 1
 
     def create_row(self):
         """
         Creates a new row at the top of the board
         """
-        self.board.insert(0, [None]*10)
+        self.create_rows_features()
+        self.board.insert(0, [None]*self.WIDTH)
+        self.version += 1
+
+    def clear_lines(self, rows):
+        """
+        Remove the complete rows among rows, which must be distinct, in one
+        pass, moving the rows above them down and creating empty rows at
+        the top. The rows between cleared rows move as whole runs.
+        Returns the indices of the rows removed in ascending order.
+        """
+        cleared = [row for row in rows if self.row_fill[row] == self.WIDTH]
+        if not cleared:
+            return cleared
+        cleared.sort()
+        self.clear_lines_features(cleared)
+        board = self.board
+        kept = [[None] * self.WIDTH for row in cleared]
+        lowest = cleared[-1]
+        if lowest - cleared[0] == len(cleared) - 1:
+            kept += board[:cleared[0]]
+        else:
+            start = 0
+            for row in cleared:
+                kept += board[start:row]
+                start = row + 1
+        board[:lowest + 1] = kept
+        self.version += 1
+        return cleared
+
+    def insert_garbage(self, count, gap, image='grey'):
+        """
+        Push every row up count rows and fill the space above the bottom
+        row with rows of image, empty only in column gap.
+        The top count rows must be empty.
+        """
+        mask = ((1 << self.WIDTH) - 1) & ~(1 << gap)
+        self.insert_garbage_features(count, mask)
+        row = [image] * self.WIDTH
+        row[gap] = None
+        del self.board[:count]
+        self.board[-1:-1] = [list(row) for garbage in range(count)]
+        self.version += 1
+
+    def row_mask(self, row):
+        """
+        Bitmask of row, bit n set when column n is occupied.
+        """
+        mask = 0
+        bit = 1
+        for image in self.board[row]:
+            if image is not None:
+                mask |= bit
+            bit <<= 1
+        return mask
+
+    def row_masks(self):
+        """
+        One bitmask per row, bit n set when column n is occupied.
+        """
+        return [self.row_mask(row) for row in range(len(self.board))]
+
+    def set_row(self, row, images):
+        """
+        Replace the contents of row with images, None for empty cells.
+        The board features are left for the caller to reset.
+        """
+        self.board[row] = list(images)
+        self.version += 1
+
+    def row_images(self, row):
+        """
+        The image of each cell in row, None for empty cells.
+        """
+        return self.board[row]
 
     def resize_board(self):
         """
@@ -0,0 +1,92 @@
+import operator
+
+# Seconds a movement key is held before it starts repeating (delayed auto
+# shift) and between repeats after that (auto repeat rate).
+DAS = 0.167
+ARR = 0.033
+
+# Inputs repeated while their key is held. Soft drop repeats from the
+# press without waiting das seconds.
+REPEATING = ("move_l", "move_r", "move_d")
+
+# Pressing either of a pair stops the other repeating until it is
+# released.
+OPPOSITES = {"move_l": "move_r", "move_r": "move_l"}
+
+
+class InputEngine(object):
+    """
+    Turns timestamped key presses and releases into timestamped inputs.
+
+    Held keys of REPEATING inputs repeat das seconds after being pressed
+    and then every arr seconds. Repeats are timestamped when they fall due
+    rather than when they are collected, so the number of repeats by any
+    time does not depend on how often the caller polls. Times are seconds
+    on any clock the caller uses consistently, such as time.perf_counter.
+    """
+
+    def __init__(self, das=DAS, arr=ARR):
+        if arr <= 0:
+            raise ValueError("arr must be positive")
+        self.das = das
+        self.arr = arr
+        self.delays = {input: das for input in REPEATING}
+        self.delays["move_d"] = arr
+        self.clear()
+
+    def clear(self):
+        """
+        Forget every held key and every input not yet collected.
+        """
+        self.held = set()
+        # Time the next repeat of each repeating input is due.
+        self.repeats = {}
+        # (time, input) pairs not yet collected by due().
+        self.ready = []
+
+    def repeat(self, until):
+        """
+        Add the repeats falling due by until to ready.
+        """
+        for input, due in self.repeats.items():
+            while due <= until:
+                self.ready.append((due, input))
+                due += self.arr
+            self.repeats[input] = due
+
+    def press(self, input, time):
+        """
+        Record the key of input being pressed at time.
+        """
+        self.repeat(time)
+        self.ready.append((time, input))
+        self.held.add(input)
+        if input in self.delays:
+            self.repeats[input] = time + self.delays[input]
+            self.repeats.pop(OPPOSITES.get(input), None)
+
+    def release(self, input, time):
+        """
+        Record the key of input being released at time.
+        A held opposite starts repeating again das seconds later.
+        """
+        self.repeat(time)
+        self.held.discard(input)
+        self.repeats.pop(input, None)
+        opposite = OPPOSITES.get(input)
+        if opposite in self.held and opposite not in self.repeats:
+            self.repeats[opposite] = time + self.delays[opposite]
+
+    def due(self, until):
+        """
+        The (time, input) pairs of presses and repeats up to until, in time
+        order. Each is returned only once.
+        """
+        self.repeat(until)
+        self.ready.sort(key=operator.itemgetter(0))
+        split = len(self.ready)
+        while split and self.ready[split - 1][0] > until:
+            split -= 1
+        inputs = self.ready[:split]
+        del self.ready[:split]
+        return inputs
@@ -1,38 +1,130 @@
+import collections
+import os
 import pygame
-pygame.init()
+
+BLOCK_SIZE = 28
+
+# Block images are tiles of one atlas, left to right in IMAGE_NAMES order.
+IMAGE_NAMES = ('green',
+               'pink',
+               'orange',
+               'yellow',
+               'blue',
+               'darkblue',
+               'red',
+               'blank',
+               'grey')
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "images")
+ATLAS_PATH = os.path.join(IMAGE_DIR, "tiles.png")
+
+# Opacity of a block image in the ghost showing where a tetromino will land.
+GHOST_ALPHA = 80
+
+
+def init():
+    """
+    Initialise only the pygame subsystems the interface needs, the display
+    and fonts. Safe to call more than once.
+    """
+    pygame.display.init()
+    pygame.font.init()
+
+
+def load_images(convert=True):
+    """
+    Load the block images by colour name from the atlas.
+    The images share the atlas pixels rather than being copies.
+    The atlas is converted to the display format only if convert is True,
+    which needs the display mode to be set.
+    """
+    atlas = pygame.image.load(ATLAS_PATH)
+    if convert:
+        atlas = atlas.convert()
+    return {name: atlas.subsurface((index * BLOCK_SIZE, 0,
+                                    BLOCK_SIZE, BLOCK_SIZE))
+            for index, name in enumerate(IMAGE_NAMES)}
+
+
+def build_ghosts(images):
+    """
+    A faint version of each block image over the blank image, by colour
+    name, for drawing the ghost tetromino.
+    """
+    ghosts = {}
+    for name, image in images.items():
+        ghost = images['blank'].copy()
+        faint = image.copy()
+        faint.set_alpha(GHOST_ALPHA)
+        ghost.blit(faint, (0, 0))
+        ghosts[name] = ghost
+    return ghosts
+
+
+def build_atlas(path=ATLAS_PATH):
+    """
+    Combine the separate block images in IMAGE_DIR into the atlas.
+    Only the colour of each pixel is kept, as when they are converted to
+    the display format.
+    """
+    import pygame.surfarray
+    atlas = pygame.Surface((len(IMAGE_NAMES) * BLOCK_SIZE, BLOCK_SIZE),
+                           depth=24)
+    pixels = pygame.surfarray.pixels3d(atlas)
+    for index, name in enumerate(IMAGE_NAMES):
+        image = pygame.image.load(
+            os.path.join(IMAGE_DIR, "{}.png".format(name)))
+        pixels[index * BLOCK_SIZE:(index + 1) * BLOCK_SIZE] = \
+            pygame.surfarray.array3d(image)
+    del pixels
+    pygame.image.save(atlas, path)
 
 
 class Interface(object):
     """
     """
 
-    def __init__(self):
+    def __init__(self, columns=10, rows=20, preview=(2, 4)):
         """
         Set-up the display and the images & fonts required.
+        columns and rows are the size of the visible board, preview the
+        rows and columns of the largest next piece.
         """
-        self.screen = pygame.display.set_mode((616, 616))
-
-        self.BLOCK_SIZE = 28
-        self.green = pygame.image.load("images/green.png").convert()
-        self.pink = pygame.image.load("images/pink.png").convert()
-        self.orange = pygame.image.load("images/orange.png").convert()
-        self.yellow = pygame.image.load("images/yellow.png").convert()
-        self.blue = pygame.image.load("images/blue.png").convert()
-        self.darkblue = pygame.image.load("images/darkblue.png").convert()
-        self.red = pygame.image.load("images/red.png").convert()
-        self.blank = pygame.image.load("images/blank.png").convert()
-        self.IMAGES = {'green': self.green,
-                       'pink': self.pink,
-                       'orange': self.orange,
-                       'yellow': self.yellow,
-                       'blue': self.blue,
-                       'darkblue': self.darkblue,
-                       'red': self.red,
-                       'blank': self.blank}
+        init()
+        self.BLOCK_SIZE = BLOCK_SIZE
+        self.ROWS = rows
+        self.PREVIEW = preview
+
+        # First column of the panel to the right of the board.
+        self.PANEL = columns + 2
+
+        self.screen = pygame.display.set_mode(
+            ((columns + 12) * self.BLOCK_SIZE,
+             max(rows + 2, 22) * self.BLOCK_SIZE))
+        self.IMAGES = load_images()
+        self.GHOSTS = build_ghosts(self.IMAGES)
 
         self.font_large = pygame.font.Font(None, 50)
         self.font_small = pygame.font.Font(None, 25)
 
+        # Locked cells of the visible board, composited as they change.
+        self.board_surface = None
+        self.drawn_board = None
+        self.drawn_version = None
+
+        # Rendered values, least recently used first.
+        self.TEXT_CACHE_SIZE = 64
+        self.text_cache = collections.OrderedDict()
+
+        # What is currently on screen, used to only redraw changes.
+        self.drawn_rows = None
+        self.drawn_tetro = set()
+        self.drawn_ghost = set()
+        self.drawn_next = None
+        self.drawn_values = {}
+        self.dirty_rects = []
+        self.full_update = True
+
         self.setup_ui()
 
     def setup_ui(self):
@@ -45,7 +137,7 @@ class Interface(object):
             """
             Display label for next tetromino.
             """
-            position = [12 * self.BLOCK_SIZE, 1 * self.BLOCK_SIZE]
+            position = [self.PANEL * self.BLOCK_SIZE, 1 * self.BLOCK_SIZE]
             label = self.font_large.render("NEXT:", True, (240, 240, 240))
             return {'label': label, 'position': position}
 
@@ -53,7 +145,7 @@ class Interface(object):
             """
             Display label for player score.
             """
-            position = [12 * self.BLOCK_SIZE, 7 * self.BLOCK_SIZE]
+            position = [self.PANEL * self.BLOCK_SIZE, 7 * self.BLOCK_SIZE]
             label = self.font_large.render("SCORE:", True, (240, 240, 240))
             return {'label': label, 'position': position}
 
@@ -61,7 +153,7 @@ class Interface(object):
             """
             Display the number of completed lines achieved.
             """
-            position = [12 * self.BLOCK_SIZE, 12 * self.BLOCK_SIZE]
+            position = [self.PANEL * self.BLOCK_SIZE, 12 * self.BLOCK_SIZE]
             label = self.font_large.render("LINES:", True, (240, 240, 240))
             return {'label': label, 'position': position}
 
@@ -70,10 +162,11 @@ class Interface(object):
             Display the controls.
             """
             labels = []
-            position = [12 * self.BLOCK_SIZE, 18 * self.BLOCK_SIZE]
+            position = [self.PANEL * self.BLOCK_SIZE, 18 * self.BLOCK_SIZE]
             controls = ["ROTATE: UP     DOWN: DOWN",
                         "LEFT: LEFT     RIGHT: RIGHT",
-                        "PAUSE: SPACE     QUIT: ESC"]
+                        "PAUSE: SPACE     QUIT: ESC",
+                        "HARD DROP: ENTER"]
 
             for control in controls:
                 label = self.font_small.render(control, True, (240, 240, 240))
@@ -91,10 +184,24 @@ class Interface(object):
                              (label['position'][0], label['position'][1]))
 
     def update_display(self, gameboard,
-                       tetro_current, tetro_next, player, lines):
+                       tetro_current, tetro_next, player, lines, ghost=None):
         """
         Display the changing parts of the user interface.
         """
+        self.draw(gameboard, tetro_current, tetro_next, player, lines, ghost)
+        self.present()
+
+    def draw(self, gameboard, tetro_current, tetro_next, player, lines,
+             ghost=None):
+        """
+        Draw the changing parts of the user interface to the screen surface.
+        Only cells, the next tetromino and scores that changed since the
+        last call are drawn, their areas are kept for present().
+        ghost is the row tetro_current would land at, as given by
+        tetris_engine.Engine.landing_row, its cells are drawn faintly
+        there. None draws no ghost.
+        """
+        dirty_rects = self.dirty_rects
 
         def clear_display(area):
             """
@@ -102,53 +209,107 @@ class Interface(object):
             """
             self.screen.fill((0, 0, 0), area)
 
-        def display_board(gameboard, tetro):
+        def update_board_surface(gameboard):
             """
-            Refresh display of the gameboard.
+            Composite rows of the gameboard that changed since the last
+            call onto board_surface. Returns the indices of those rows.
             """
-            position = (1 * self.BLOCK_SIZE, 1 * self.BLOCK_SIZE)
-            dimensions = (gameboard.WIDTH * self.BLOCK_SIZE,
-                          gameboard.HEIGHT * self.BLOCK_SIZE)
-            board_area = pygame.Rect(position[0], position[1],
-                                     dimensions[0], dimensions[1])
+            visible_rows = gameboard.HEIGHT - 1 - gameboard.HIDDEN_ROWS
+            if self.board_surface is None:
+                self.board_surface = pygame.Surface(
+                    (gameboard.WIDTH * self.BLOCK_SIZE,
+                     visible_rows * self.BLOCK_SIZE)).convert()
+                self.drawn_rows = [None] * visible_rows
 
-            def display_tetro_current():
-                """
-                Display the in-play tetromino.
-                """
-                offset_hori = position[0]
-                offset_vert = position[1]
-                for block in tetro.absolute_position():
-                    block[0] -= gameboard.HIDDEN_ROWS
-                    if not block[0] < 0:
-                        self.screen.blit(self.IMAGES[tetro.image],
-                                         (block[1] * self.BLOCK_SIZE
-                                          + offset_hori,
-                                          block[0] * self.BLOCK_SIZE
-                                          + offset_vert))
-
-            clear_display(board_area)
+            if (gameboard is self.drawn_board and
+                    gameboard.version == self.drawn_version):
+                return []
+            self.drawn_board = gameboard
+            self.drawn_version = gameboard.version
 
-            offset_vert = position[1]
-            for row in gameboard.board[gameboard.HIDDEN_ROWS:gameboard.HEIGHT]:
-                offset_hori = position[0]
-                for image in row:
-                    if image is None:
-                        image = 'blank'
-                    if image != 'bottom':
-                        self.screen.blit(self.IMAGES[image],
-                                         (offset_hori, offset_vert))
-                    offset_hori += self.BLOCK_SIZE
-                offset_vert += self.BLOCK_SIZE
-
-            display_tetro_current()
+            changed_rows = []
+            for row in range(visible_rows):
+                images = gameboard.row_images(row + gameboard.HIDDEN_ROWS)
+                if images != self.drawn_rows[row]:
+                    for column, image in enumerate(images):
+                        self.board_surface.blit(
+                            self.IMAGES[image or 'blank'],
+                            (column * self.BLOCK_SIZE,
+                             row * self.BLOCK_SIZE))
+                    self.drawn_rows[row] = list(images)
+                    changed_rows.append(row)
+            return changed_rows
+
+        def display_board(gameboard, tetro, ghost):
+            """
+            Restore changed areas from board_surface then draw the ghost
+            and in-play tetromino.
+            """
+            offset_hori = 1 * self.BLOCK_SIZE
+            offset_vert = 1 * self.BLOCK_SIZE
+            changed_rows = update_board_surface(gameboard)
+
+            # In-play tetromino cells, relative to the first visible row
+            tetro_cells = set()
+            for block in tetro.absolute_position():
+                row = block[0] - gameboard.HIDDEN_ROWS
+                if not row < 0:
+                    tetro_cells.add((row, block[1]))
+
+            # Ghost cells not covered by the tetromino
+            ghost_cells = set()
+            if ghost is not None:
+                col = tetro.temp_position[1]
+                for block in tetro.temp_shape:
+                    row = block[0] + ghost - gameboard.HIDDEN_ROWS
+                    if not row < 0:
+                        ghost_cells.add((row, block[1] + col))
+                ghost_cells -= tetro_cells
+
+            if (tetro_cells == self.drawn_tetro and
+                    ghost_cells == self.drawn_ghost and not changed_rows):
+                return
+
+            areas = [pygame.Rect(0, row * self.BLOCK_SIZE,
+                                 gameboard.WIDTH * self.BLOCK_SIZE,
+                                 self.BLOCK_SIZE)
+                     for row in changed_rows]
+            areas.extend(pygame.Rect(column * self.BLOCK_SIZE,
+                                     row * self.BLOCK_SIZE,
+                                     self.BLOCK_SIZE, self.BLOCK_SIZE)
+                         for row, column in
+                         (self.drawn_tetro | self.drawn_ghost) -
+                         (tetro_cells | ghost_cells))
+            for area in areas:
+                dirty_rects.append(self.screen.blit(
+                    self.board_surface,
+                    (area.x + offset_hori, area.y + offset_vert), area))
+
+            for row, column in ghost_cells:
+                dirty_rects.append(self.screen.blit(
+                    self.GHOSTS[tetro.image],
+                    (column * self.BLOCK_SIZE + offset_hori,
+                     row * self.BLOCK_SIZE + offset_vert)))
+            for row, column in tetro_cells:
+                dirty_rects.append(self.screen.blit(
+                    self.IMAGES[tetro.image],
+                    (column * self.BLOCK_SIZE + offset_hori,
+                     row * self.BLOCK_SIZE + offset_vert)))
+            self.drawn_tetro = tetro_cells
+            self.drawn_ghost = ghost_cells
 
         def display_tetro_next(tetro):
             """
-            Display the next tetromino.
+            Display the next tetromino if it has changed.
             """
-            position = (15 * self.BLOCK_SIZE, 4 * self.BLOCK_SIZE)
-            dimensions = (4 * self.BLOCK_SIZE, 2 * self.BLOCK_SIZE)
+            if tetro is self.drawn_next:
+                return
+            self.drawn_next = tetro
+
+            position = ((self.PANEL + 3) * self.BLOCK_SIZE,
+                        4 * self.BLOCK_SIZE)
+            dimensions = (self.PREVIEW[1] * self.BLOCK_SIZE,
+                          self.PREVIEW[0] * self.BLOCK_SIZE)
             tetro_area = pygame.Rect(position[0], position[1],
                                      dimensions[0], dimensions[1])
 
@@ -159,40 +320,75 @@ class Interface(object):
                 self.screen.blit(self.IMAGES[tetro.image],
                                  (offset_hori + block[1]*self.BLOCK_SIZE,
                                   offset_vert + block[0]*self.BLOCK_SIZE))
+            dirty_rects.append(tetro_area)
 
         def display_scores(player, lines):
             """
-            Display current player scores.
+            Display current player scores that have changed.
             """
             def display_value(position, value):
                 """
                 Display value passed at position passed.
                 """
+                key = tuple(position)
+                if self.drawn_values.get(key) == value:
+                    return
+                self.drawn_values[key] = value
+
                 dimensions = (6 * self.BLOCK_SIZE, 2 * self.BLOCK_SIZE)
                 area = pygame.Rect(position[0], position[1],
                                    dimensions[0], dimensions[1])
 
                 clear_display(area)
-                display = self.font_large.render(str(value),
-                                                 True, (240, 240, 240))
+                display = self.render_value(value)
                 self.screen.blit(display, (position[0], position[1]))
+                dirty_rects.append(area)
 
-            score_position = [16 * self.BLOCK_SIZE, 9 * self.BLOCK_SIZE]
-            lines_position = [16 * self.BLOCK_SIZE, 14 * self.BLOCK_SIZE]
+            score_position = [(self.PANEL + 4) * self.BLOCK_SIZE,
+                              9 * self.BLOCK_SIZE]
+            lines_position = [(self.PANEL + 4) * self.BLOCK_SIZE,
+                              14 * self.BLOCK_SIZE]
 
             display_value(score_position, player.score)
             display_value(lines_position, lines)
 
-        display_board(gameboard, tetro_current)
+        display_board(gameboard, tetro_current, ghost)
         display_tetro_next(tetro_next)
         display_scores(player, lines)
-        pygame.display.update()
+
+    def present(self):
+        """
+        Update the areas of the display drawn since the last present().
+        """
+        if self.full_update:
+            self.full_update = False
+            pygame.display.update()
+        elif self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
+        self.dirty_rects = []
+
+    def render_value(self, value):
+        """
+        Render value in the large font, reusing recently rendered values.
+        """
+        text = str(value)
+        display = self.text_cache.pop(text, None)
+        if display is None:
+            display = self.font_large.render(text, True, (240, 240, 240))
+            if len(self.text_cache) >= self.TEXT_CACHE_SIZE:
+                self.text_cache.popitem(last=False)
+        self.text_cache[text] = display
+        return display
 
     def display_game_over(self):
         """
         Informs the player the current game has ended.
         """
-        position = [2 * self.BLOCK_SIZE, 10 * self.BLOCK_SIZE]
+        position = [2 * self.BLOCK_SIZE, self.ROWS // 2 * self.BLOCK_SIZE]
         label = self.font_large.render("GAME  OVER", True, (240, 240, 240))
         self.screen.blit(label, (position[0], position[1]))
         pygame.display.update()
+
+
+if __name__ == "__main__":
+    build_atlas()
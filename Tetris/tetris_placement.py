@@ -0,0 +1,194 @@
+import collections
+import tetris_tetrominos as tetro
+
+# Final resting spot of a tetromino, as its rotation index and origin.
+Placement = collections.namedtuple('Placement', ['rotation', 'row', 'col'])
+
+
+def build_padding(table, rotations):
+    """
+    How far left of the board the origin of each tetromino can go, the
+    largest min_col over its rotations.
+    State lists hold that many columns before column 0 and one spare
+    column after the board, which never fits, so moving off either side
+    of the board always lands on an empty state.
+    """
+    return {name: max(0, max(table[(name, rotation)].bounds[1]
+                             for rotation in range(count)))
+            for name, count in rotations.items()}
+
+
+def build_duplicates(table, rotations):
+    """
+    Find rotations that cover the same cells as an earlier rotation of the
+    same tetromino, moved by some offset.
+    Returns {(name, rotation): (earlier_rotation, row_offset, col_offset)}
+    for each of them.
+    """
+    duplicates = {}
+    for name, count in rotations.items():
+        for rotation in range(count):
+            blocks = sorted(table[(name, rotation)].blocks)
+            for earlier in range(rotation):
+                other = sorted(table[(name, earlier)].blocks)
+                offset = (blocks[0][0] - other[0][0],
+                          blocks[0][1] - other[0][1])
+                if all((block[0] - moved[0], block[1] - moved[1]) == offset
+                       for block, moved in zip(blocks, other)):
+                    duplicates[(name, rotation)] = (earlier,) + offset
+                    break
+    return duplicates
+
+
+PADDING = build_padding(tetro.SHAPE_TABLE, tetro.ROTATIONS)
+BLOCKS = {key: entry.blocks for key, entry in tetro.SHAPE_TABLE.items()}
+DUPLICATES = build_duplicates(tetro.SHAPE_TABLE, tetro.ROTATIONS)
+
+
+def column_masks(board):
+    """
+    Transpose the board into one bitmask per column, bit n set when row n
+    of that column is occupied.
+    """
+    masks = [0] * board.WIDTH
+    for row, row_mask in enumerate(board.row_masks()):
+        bit = 1 << row
+        column = 0
+        while row_mask:
+            if row_mask & 1:
+                masks[column] |= bit
+            row_mask >>= 1
+            column += 1
+    return masks
+
+
+def fill_down(reached, free):
+    """
+    Extend every reached row downwards through consecutive free rows.
+    """
+    reached |= free & (reached << 1)
+    free &= free << 1
+    reached |= free & (reached << 2)
+    free &= free << 2
+    reached |= free & (reached << 4)
+    free &= free << 4
+    reached |= free & (reached << 8)
+    free &= free << 8
+    reached |= free & (reached << 16)
+    return reached
+
+
+def fill_down_tall(reached, free, height):
+    """
+    fill_down for boards of any height. fill_down only extends through
+    runs of up to 31 free rows.
+    """
+    shift = 1
+    while shift < height:
+        reached |= free & (reached << shift)
+        free &= free << shift
+        shift <<= 1
+    return reached
+
+
+def fits(board, name, columns=None):
+    """
+    For each rotation and origin column of tetromino name, a bitmask of the
+    origin rows where it lies on the board without overlapping anything.
+    Returns a flat list indexed by
+    rotation * (WIDTH + PADDING[name] + 1) + col + PADDING[name],
+    holding 0 for origin columns that would put a block off the board.
+    """
+    if columns is None:
+        columns = column_masks(board)
+    height = board.HEIGHT
+    width = board.WIDTH
+    left = PADDING[name]
+    stride = width + left + 1
+
+    # shifted[row_offset][col] has bit n set when the cell row_offset rows
+    # below row n of col is occupied.
+    shifted = {}
+    free = [0] * (tetro.ROTATIONS[name] * stride)
+    for rotation in range(tetro.ROTATIONS[name]):
+        min_row, min_col, max_row, max_col = \
+            tetro.SHAPE_TABLE[(name, rotation)].bounds
+        on_board = ((1 << (height - max_row)) - 1) >> max(0, -min_row) \
+            << max(0, -min_row)
+        blocks = BLOCKS[(name, rotation)]
+        for row_offset, col_offset in blocks:
+            if row_offset not in shifted:
+                if row_offset >= 0:
+                    shifted[row_offset] = [occupied >> row_offset
+                                           for occupied in columns]
+                else:
+                    shifted[row_offset] = [occupied << -row_offset
+                                           for occupied in columns]
+        index = rotation * stride + left
+        for col in range(-min_col, width - max_col):
+            blocked = 0
+            for row_offset, col_offset in blocks:
+                blocked |= shifted[row_offset][col + col_offset]
+            free[index + col] = on_board & ~blocked
+    return free
+
+
+def placements(board, name, rotation=0, position=None):
+    """
+    Every distinct final placement of tetromino name reachable from
+    rotation and position with the moves of tetris_engine.Engine, slides
+    and tucks included. Placements covering the same cells are returned
+    once. The board and any live tetromino are left untouched.
+    position defaults to the spawn position for the board width.
+    """
+    if position is None:
+        position = (0, tetro.spawn_column(board.WIDTH))
+    if board.HEIGHT < 32:
+        fill = fill_down
+    else:
+        def fill(reached, free):
+            return fill_down_tall(reached, free, board.HEIGHT)
+    free = fits(board, name)
+    left = PADDING[name]
+    stride = board.WIDTH + left + 1
+    size = len(free)
+    if not -left <= position[1] < board.WIDTH:
+        return []
+    start = rotation * stride + position[1] + left
+    if not free[start] >> position[0] & 1:
+        return []
+
+    # Bit n of reached[state] is set when origin row n is reachable
+    reached = [0] * size
+    reached[start] = fill(1 << position[0], free[start])
+    pending = [start]
+    while pending:
+        state = pending.pop()
+        rows = reached[state]
+        for move in (state - 1, state + 1, (state + stride) % size):
+            new = rows & free[move] & ~reached[move]
+            if new:
+                reached[move] = fill(reached[move] | new, free[move])
+                pending.append(move)
+
+    found = []
+    seen = set()
+    for state, rows in enumerate(reached):
+        if not rows:
+            continue
+        rotation, col = divmod(state, stride)
+        col -= left
+        resting = rows & ~(free[state] >> 1)
+        duplicate = DUPLICATES.get((name, rotation))
+        while resting:
+            low = resting & -resting
+            resting ^= low
+            row = low.bit_length() - 1
+            if duplicate is None:
+                key = (rotation, row, col)
+            else:
+                key = (duplicate[0], row + duplicate[1], col + duplicate[2])
+            if key not in seen:
+                seen.add(key)
+                found.append(Placement(rotation, row, col))
+    return found
@@ -1,5 +1,20 @@
+import time
+# pygame.event.wait takes a timeout from pygame 2.0, the minimum the
+# Pipfile allows.
 import pygame.event
 import pygame.key
+import tetris_engine as engine
+import tetris_ai as ai
+import tetris_input as input_module
+
+# Input produced by each key.
+KEYS = {pygame.K_ESCAPE: "quit",
+        pygame.K_SPACE: "pause",
+        pygame.K_UP: "rotate",
+        pygame.K_LEFT: "move_l",
+        pygame.K_RIGHT: "move_r",
+        pygame.K_DOWN: "move_d",
+        pygame.K_RETURN: "drop"}
 
 
 class Player(object):
@@ -7,44 +22,122 @@ class Player(object):
     Represents the players interaction with tetris_game.
     """
 
-    def __init__(self):
+    def __init__(self, das=input_module.DAS, arr=input_module.ARR):
         """
-        Ensure correct pygame key events are logged.
+        das and arr are the seconds a movement key is held before it
+        repeats and between repeats, see tetris_input.InputEngine.
         """
         self.score = 0
+        self.input = input_module.InputEngine(das, arr)
+        # Quit and pause inputs read by wait(), returned by the next poll().
+        self.pending = []
 
+    def bind(self, engine):
+        """
+        Called by Tetris_Game with the engine being played, once the
+        display is initialised. Ensure correct pygame key events are logged.
+        """
         pygame.event.set_allowed(None)
-        pygame.event.set_allowed(pygame.KEYDOWN)
-        pygame.key.set_repeat(1, 160)
+        pygame.event.set_allowed([pygame.KEYDOWN, pygame.KEYUP, pygame.QUIT])
+        # Held keys are repeated by the input engine, not by pygame.
+        pygame.key.set_repeat()
 
-    def get_input(self):
+    def translate(self, events, now):
         """
-        Gather player inputs into a list.
+        Pass presses and releases of the action keys among pygame events
+        read at time now to the input engine. Returns the (time, input)
+        pairs of the other inputs, quit on closing the window and the
+        KEYS presses of quit and pause. Other events are ignored.
         """
         inputs = []
+        for event in events:
+            if event.type == pygame.KEYDOWN:
+                input = KEYS.get(event.key)
+                if input in engine.ACTIONS:
+                    self.input.press(input, now)
+                elif input is not None:
+                    inputs.append((now, input))
+            elif event.type == pygame.KEYUP:
+                input = KEYS.get(event.key)
+                if input in engine.ACTIONS:
+                    self.input.release(input, now)
+            elif event.type == pygame.QUIT:
+                inputs.append((now, "quit"))
+        return inputs
+
+    def wait(self, timeout_seconds):
+        """
+        Block until an event arrives or timeout_seconds pass, reading any
+        events so they are timestamped as they arrive rather than at the
+        next poll().
+        """
+        if timeout_seconds >= 0.001:
+            event = pygame.event.wait(int(timeout_seconds * 1000))
+            if event.type != pygame.NOEVENT:
+                self.pending.extend(self.translate(
+                    [event] + pygame.event.get(), time.perf_counter()))
+        elif timeout_seconds > 0:
+            time.sleep(timeout_seconds)
 
-        for event in pygame.event.get():
-            if event.key == pygame.K_ESCAPE:
-                inputs.append("quit")
-            if event.key == pygame.K_SPACE:
-                inputs.append("pause")
-            if event.key == pygame.K_UP:
-                inputs.append("rotate")
-            if event.key == pygame.K_LEFT:
-                inputs.append("move_l")
-            if event.key == pygame.K_RIGHT:
-                inputs.append("move_r")
-            if event.key == pygame.K_DOWN:
-                inputs.append("move_d")
+    def poll(self):
+        """
+        Gather player inputs into a list of (time, input) pairs, quit and
+        pause then the actions pressed or repeating by now in time order.
+        """
+        now = time.perf_counter()
+        inputs = self.pending + self.translate(pygame.event.get(), now)
+        self.pending = []
+        inputs.extend(self.input.due(now))
         return inputs
 
-    def update_score(self, lines, level):
+    def get_input(self):
         """
-        Updates the player score based on the gameboy version scoring system.
+        Gather player inputs into a list.
         """
-        points = {1: 40,
-                  2: 100,
-                  3: 300,
-                  4: 1200}
+        return [input for stamp, input in self.poll()]
 
-        self.score += (points[lines] * (level))
+    def wait_input(self, timeout_seconds):
+        """
+        Block until an event arrives or timeout_seconds pass, then gather
+        the quit and pause inputs waiting. Used while the game is idle, so
+        actions are dropped and held keys forgotten rather than repeating
+        once it resumes.
+        """
+        # A timeout of 0 would make pygame wait for an event forever.
+        event = pygame.event.wait(max(1, int(timeout_seconds * 1000)))
+        inputs = self.pending + self.translate([event] + pygame.event.get(),
+                                               time.perf_counter())
+        self.pending = []
+        self.input.clear()
+        return [input for stamp, input in inputs]
+
+
+class AIPlayer(Player):
+    """
+    Plays the game with tetris_ai.Planner, one move per call to poll.
+    The keyboard can still pause and quit.
+    """
+
+    def __init__(self, lookahead=2, beam=6, workers=0):
+        super(AIPlayer, self).__init__()
+        self.planner = ai.Planner(lookahead, beam, workers)
+        self.engine = None
+
+    def bind(self, engine):
+        """
+        Play the given engine.
+        """
+        super(AIPlayer, self).bind(engine)
+        self.engine = engine
+
+    def poll(self):
+        """
+        Keyboard pause and quit inputs, then the planned move.
+        """
+        inputs = [(stamp, input)
+                  for stamp, input in super(AIPlayer, self).poll()
+                  if input in ('quit', 'pause')]
+        if self.engine is not None and not self.engine.game_over:
+            inputs.append((time.perf_counter(),
+                           self.planner.next_move(self.engine)))
+        return inputs
@@ -0,0 +1,111 @@
+import abc
+import array
+import collections
+import copy
+import random
+import tetris_tetrominos as tetro
+
+
+class Randomizer(abc.ABC):
+    """
+    Deals the pieces of a game from its own seeded random.Random, so games
+    never share a generator and the same seed always deals the same
+    pieces.
+
+    Pieces are dealt in sets, lists of names taken from the end as
+    tetris_engine.Engine takes them from tetro_set. Subclasses provide
+    new_bag.
+    """
+
+    def __init__(self, shapes, seed=None):
+        """
+        shapes are the names of the pieces to deal.
+        A seed of None seeds from the operating system.
+        """
+        self.shapes = tuple(shapes)
+        self.random = random.Random(seed)
+        # Pieces of the last set not yet returned by sequence().
+        self.leftover = array.array('B')
+
+    @abc.abstractmethod
+    def new_bag(self):
+        """
+        The next set of pieces, the last piece being dealt first.
+        """
+
+    def sequence(self, count):
+        """
+        The next count pieces in the order dealt, as an array of
+        tetro.NAMES indices, one byte per piece.
+        Each call carries on from where the last stopped, so it should
+        not be mixed with new_bag.
+        """
+        indices = {name: tetro.NAMES.index(name) for name in self.shapes}
+        pieces = self.leftover
+        while len(pieces) < count:
+            bag = self.new_bag()
+            pieces.extend(map(indices.__getitem__, reversed(bag)))
+        self.leftover = pieces[count:]
+        del pieces[count:]
+        return pieces
+
+    def copy(self):
+        """
+        An independent Randomizer in the same state.
+        """
+        return copy.deepcopy(self)
+
+
+class BagRandomizer(Randomizer):
+    """
+    Deals every piece once per bag in a random order, so a piece is never
+    more than two bags' length apart from the last of its kind.
+    """
+
+    def new_bag(self):
+        bag = list(self.shapes)
+        self.random.shuffle(bag)
+        return bag
+
+
+class PureRandomizer(Randomizer):
+    """
+    Deals each piece independently and uniformly at random.
+    Sets are the length of a bag so replays record them as compactly.
+    """
+
+    def new_bag(self):
+        return self.random.choices(self.shapes, k=len(self.shapes))
+
+
+class HistoryRandomizer(Randomizer):
+    """
+    Deals pieces at random, drawing up to rolls times until the piece is
+    not among the last history pieces dealt. Repeats are rare without the
+    fixed order of a bag.
+    """
+
+    def __init__(self, shapes, seed=None, history=4, rolls=4):
+        super(HistoryRandomizer, self).__init__(shapes, seed)
+        self.history = collections.deque(maxlen=history)
+        self.rolls = rolls
+
+    def new_bag(self):
+        choice = self.random.choice
+        history = self.history
+        dealt = []
+        for piece in range(len(self.shapes)):
+            name = choice(self.shapes)
+            for roll in range(self.rolls - 1):
+                if name not in history:
+                    break
+                name = choice(self.shapes)
+            history.append(name)
+            dealt.append(name)
+        dealt.reverse()
+        return dealt
+
+
+RANDOMIZERS = {'bag': BagRandomizer,
+               'random': PureRandomizer,
+               'history': HistoryRandomizer}
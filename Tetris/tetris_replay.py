@@ -0,0 +1,280 @@
+import random
+import tetris_engine as engine
+import tetris_tetrominos as tetro
+import tetris_gameboard as gameboard
+import tetris_scheduler as scheduler
+
+# A replay is MAGIC followed by records, each a type byte and payload:
+#   SEED    uvarint seed
+#   BAG     one byte per piece, its index in tetro.NAMES
+#   ACTION  uvarint ticks since the previous ACTION, action index byte
+#   END     uvarint ticks since the previous ACTION
+#   VARIANT uvarint height and width, then a BAG of the variant shapes
+# Records are only ever appended, so a replay can be read while written.
+# A VARIANT record may follow the SEED, without one the game is
+# tetris_engine.STANDARD.
+MAGIC = b'TTRPLY\x01'
+SEED = 1
+BAG = 2
+ACTION = 3
+END = 4
+VARIANT = 5
+
+
+class ReplayError(Exception):
+    """
+    Raised when a replay is malformed.
+    """
+
+
+def encode_uvarint(value):
+    """
+    Encode a non-negative integer in 7 bit groups, low group first.
+    """
+    if value < 0:
+        raise ValueError("cannot encode negative {}".format(value))
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+def read_uvarint(stream):
+    """
+    Read an integer written by encode_uvarint from stream.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            raise ReplayError("replay ends inside a number")
+        value |= (byte[0] & 0x7f) << shift
+        if not byte[0] & 0x80:
+            return value
+        shift += 7
+
+
+def encode_bag(names):
+    """
+    Encode a list of piece names as a count and their tetro.NAMES indices.
+    """
+    return bytes([len(names)]) + bytes(tetro.NAMES.index(name)
+                                       for name in names)
+
+
+def read_bag(stream):
+    """
+    Read a list of piece names written by encode_bag from stream.
+    """
+    size = stream.read(1)
+    indices = stream.read(size[0]) if size else b''
+    if not size or len(indices) != size[0]:
+        raise ReplayError("replay ends inside a bag")
+    return [tetro.NAMES[index] for index in indices]
+
+
+class ReplayWriter(object):
+    """
+    Appends replay records to a binary stream.
+    """
+
+    def __init__(self, stream):
+        """
+        Start the replay by writing MAGIC to stream.
+        """
+        self.stream = stream
+        self.tick = 0
+        self.stream.write(MAGIC)
+
+    def write_seed(self, seed):
+        """
+        Record the seed the engine was reset with.
+        """
+        self.stream.write(bytes([SEED]) + encode_uvarint(seed))
+
+    def write_variant(self, variant):
+        """
+        Record the board size and pieces of the game.
+        """
+        self.stream.write(bytes([VARIANT]) +
+                          encode_uvarint(variant.height) +
+                          encode_uvarint(variant.width) +
+                          encode_bag(variant.shapes))
+
+    def write_bag(self, tetro_set):
+        """
+        Record a new bag in the order it was shuffled.
+        """
+        self.stream.write(bytes([BAG]) + encode_bag(tetro_set))
+
+    def write_action(self, tick, action):
+        """
+        Record an action applied at tick.
+        """
+        self.stream.write(bytes([ACTION]) +
+                          encode_uvarint(tick - self.tick) +
+                          bytes([engine.ACTIONS.index(action)]))
+        self.tick = tick
+
+    def write_end(self, tick):
+        """
+        Record the tick the game stopped at.
+        """
+        self.stream.write(bytes([END]) + encode_uvarint(tick - self.tick))
+
+    def flush(self):
+        """
+        Push written records out to the stream.
+        """
+        self.stream.flush()
+
+    def close(self):
+        """
+        Close the stream.
+        """
+        self.stream.close()
+
+
+def read_records(stream):
+    """
+    Yield (type, value) for each record of a replay stream, one at a time.
+    Values are the seed, a bag of piece names, an (tick, action) pair,
+    the final tick or a tetris_engine.Variant.
+    """
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ReplayError("not a replay")
+    tick = 0
+    while True:
+        record = stream.read(1)
+        if not record:
+            return
+        record = record[0]
+        if record == SEED:
+            yield SEED, read_uvarint(stream)
+        elif record == BAG:
+            yield BAG, read_bag(stream)
+        elif record == ACTION:
+            tick += read_uvarint(stream)
+            action = stream.read(1)
+            if not action:
+                raise ReplayError("replay ends inside an action")
+            yield ACTION, (tick, engine.ACTIONS[action[0]])
+        elif record == END:
+            yield END, tick + read_uvarint(stream)
+        elif record == VARIANT:
+            height = read_uvarint(stream)
+            width = read_uvarint(stream)
+            yield VARIANT, engine.Variant(height, width,
+                                          tuple(read_bag(stream)))
+        else:
+            raise ReplayError("unknown record type {}".format(record))
+
+
+class Recorder(object):
+    """
+    Records an Engine game to a binary stream as it is played.
+    """
+
+    def __init__(self, stream, tetris, seed=None):
+        """
+        Restart tetris with seed and record it to stream.
+        A seed of None picks a random seed so the game can be replayed,
+        any other must be a non-negative int.
+        """
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+        elif (not isinstance(seed, int) or isinstance(seed, bool) or
+              seed < 0):
+            raise ValueError("replay seeds must be non-negative integers, "
+                             "not {!r}".format(seed))
+        self.writer = ReplayWriter(stream)
+        self.writer.write_seed(seed)
+        if tetris.variant != engine.STANDARD:
+            self.writer.write_variant(tetris.variant)
+        self.engine = tetris
+        tetris.on_new_bag = self.writer.write_bag
+        tetris.reset(seed)
+        self.writer.flush()
+
+    def record_tick(self, tick, actions):
+        """
+        Record the actions applied at tick.
+        """
+        for action in actions:
+            self.writer.write_action(tick, action)
+
+    def close(self):
+        """
+        Record the tick the game stopped at and close the stream.
+        """
+        self.engine.on_new_bag = None
+        self.writer.write_end(self.engine.ticks)
+        self.writer.close()
+
+
+def play(stream, board_class=gameboard.Gameboard, realtime=False,
+         render=None):
+    """
+    Re-execute a recorded game and return the engine at its final state.
+    Records are read as they are needed, so long replays are not held in
+    memory. In realtime mode ticks run at their original rate and render
+    is called with the engine as frames are drawn.
+    """
+    records = read_records(stream)
+    record, seed = next(records, (None, None))
+    if record != SEED:
+        raise ReplayError("replay does not start with a seed")
+    first = next(records, (END, None))
+    if first[0] == VARIANT:
+        tetris = engine.Engine(board_class, variant=first[1])
+        first = None
+    else:
+        tetris = engine.Engine(board_class)
+
+    def read_until_action():
+        """
+        Queue bags until the next action or end record, return that record.
+        """
+        for record, value in records:
+            if record == BAG:
+                tetris.bag_queue.append(value)
+            elif record in (SEED, VARIANT):
+                raise ReplayError("game settings recorded twice")
+            else:
+                return record, value
+        return END, None
+
+    if first is not None and first[0] == SEED:
+        raise ReplayError("game settings recorded twice")
+    if first is not None and first[0] == BAG:
+        tetris.bag_queue.append(first[1])
+        first = None
+    pending = [first or read_until_action()]
+    tetris.reset(seed)
+
+    def tick():
+        """
+        Apply the actions recorded for the current tick.
+        """
+        actions = []
+        while pending[0][0] == ACTION and pending[0][1][0] == tetris.ticks:
+            actions.append(pending[0][1][1])
+            pending[0] = read_until_action()
+        record, value = pending[0]
+        if (not actions and record == END and
+                (value is None or tetris.ticks >= value)):
+            replay.stop()
+            return
+        tetris.tick(actions)
+
+    replay = scheduler.Scheduler(
+        tick, render=None if render is None else lambda: render(tetris),
+        realtime=realtime)
+    replay.run()
+    return tetris
@@ -0,0 +1,174 @@
+import array
+import collections
+import multiprocessing
+import random
+import time
+from multiprocessing import shared_memory
+import tetris_engine as engine
+import tetris_bitboard as bitboard
+import tetris_randomizer as randomizer_module
+
+Result = collections.namedtuple('Result', ['game',
+                                           'seed',
+                                           'score',
+                                           'lines',
+                                           'level',
+                                           'pieces'])
+
+Report = collections.namedtuple('Report', ['results',
+                                           'elapsed',
+                                           'games_per_second'])
+
+# Each game's board is stored in shared memory as HEIGHT unsigned row
+# masks, as held by Bitboard.rows, in the smallest array format that fits
+# the board width.
+ROW_FORMATS = (('H', 16), ('I', 32), ('Q', 64))
+
+
+def row_format(width):
+    """
+    The array format of a row mask width bits wide.
+    """
+    for format, bits in ROW_FORMATS:
+        if width <= bits:
+            return format
+    raise ValueError("boards wider than 64 columns are not supported")
+
+
+_worker = {}
+
+
+def random_policy(tetris, rng):
+    """
+    Pick an action at random, favouring moving down so games end.
+    """
+    return rng.choice(("rotate", "move_l", "move_r",
+                       "move_d", "move_d", "move_d"))
+
+
+def _attach(name, variant, policy, max_steps, randomizer_class):
+    """
+    Pool initializer, attach the worker to the shared board memory.
+    """
+    memory = shared_memory.SharedMemory(name=name)
+    _worker['memory'] = memory
+    _worker['boards'] = memory.buf.cast(row_format(variant.width))
+    _worker['variant'] = variant
+    _worker['policy'] = policy
+    _worker['max_steps'] = max_steps
+    _worker['randomizer_class'] = randomizer_class
+
+
+def _play(job):
+    """
+    Play one game to the end in a worker process.
+    The board is published to shared memory after every lock.
+    """
+    game, seed = job
+    boards = _worker['boards']
+    variant = _worker['variant']
+    height = variant.height
+    policy = _worker['policy']
+    max_steps = _worker['max_steps']
+
+    rng = random.Random(seed)
+    tetris = engine.Engine(bitboard.Bitboard, seed, variant,
+                           _worker['randomizer_class'])
+    offset = game * height
+    pieces = 0
+    steps = 0
+    while not tetris.game_over and steps != max_steps:
+        state = tetris.step(policy(tetris, rng))
+        steps += 1
+        if state.locked:
+            pieces += 1
+            boards[offset:offset + height] = array.array(
+                boards.format, tetris.board.rows)
+    return Result(game, seed, tetris.score, tetris.lines, tetris.level,
+                  pieces)
+
+
+class Runner(object):
+    """
+    Plays many headless games across a pool of worker processes.
+
+    Workers write each game's board into a shared memory block rather
+    than sending it back through the pool, so only the small Result
+    tuples are pickled.
+    """
+
+    def __init__(self, policy=random_policy, processes=None,
+                 max_steps=None, variant=engine.STANDARD,
+                 randomizer_class=randomizer_module.BagRandomizer):
+        """
+        policy is called with the engine and a random.Random for the game
+        and returns an action. It must be picklable, so defined at module
+        level. processes defaults to the number of cores. max_steps caps
+        the length of a game, None plays until game over. variant sets the
+        board size and pieces and randomizer_class deals them, as for
+        Engine.
+        """
+        self.policy = policy
+        self.processes = processes or multiprocessing.cpu_count()
+        self.max_steps = max_steps
+        self.variant = variant
+        self.randomizer_class = randomizer_class
+        self.height = variant.height
+        self.format = row_format(variant.width)
+        self.memory = None
+
+    def run(self, seeds):
+        """
+        Play one game per seed and return a Report of the results in seed
+        order, with the throughput achieved.
+        """
+        seeds = list(seeds)
+        self.close()
+        self.memory = shared_memory.SharedMemory(
+            create=True,
+            size=max(1, len(seeds) * self.height *
+                     array.array(self.format).itemsize))
+
+        start = time.perf_counter()
+        pool = multiprocessing.Pool(self.processes, _attach,
+                                    (self.memory.name, self.variant,
+                                     self.policy, self.max_steps,
+                                     self.randomizer_class))
+        try:
+            chunksize = max(1, len(seeds) // (self.processes * 4))
+            results = list(pool.imap_unordered(_play, enumerate(seeds),
+                                               chunksize))
+        finally:
+            pool.close()
+            pool.join()
+        elapsed = time.perf_counter() - start
+
+        results.sort(key=lambda result: result.game)
+        return Report(results, elapsed, len(results) / elapsed)
+
+    def board(self, game):
+        """
+        The final row masks of a game from the last run.
+        """
+        boards = self.memory.buf.cast(self.format)
+        try:
+            return list(boards[game * self.height:(game + 1) * self.height])
+        finally:
+            boards.release()
+
+    def close(self):
+        """
+        Release the shared memory of the last run.
+        """
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+
+if __name__ == "__main__":
+    runner = Runner()
+    report = runner.run(range(runner.processes * 8))
+    runner.close()
+    print("{} games in {:.2f}s, {:.1f} games/sec".format(
+        len(report.results), report.elapsed, report.games_per_second))
@@ -0,0 +1,185 @@
+import array
+import time
+
+# Columns of each FrameTimings record.
+PHASES = ("input", "logic", "render", "present")
+
+
+class FrameTimings(object):
+    """
+    Ring buffer holding the seconds spent in each of PHASES for the most
+    recent frames. Storage is allocated once up front.
+    """
+
+    def __init__(self, size=600):
+        self.size = size
+        self.frames = 0
+        self.data = array.array('d', bytes(8 * size * len(PHASES)))
+
+    def record(self, *durations):
+        """
+        Store the durations of one frame, one per phase.
+        """
+        index = (self.frames % self.size) * len(PHASES)
+        self.data[index:index + len(PHASES)] = array.array('d', durations)
+        self.frames += 1
+
+    def records(self):
+        """
+        Yield (frame, durations) for the stored frames, oldest first.
+        """
+        first = max(0, self.frames - self.size)
+        for frame in range(first, self.frames):
+            index = (frame % self.size) * len(PHASES)
+            yield frame, tuple(self.data[index:index + len(PHASES)])
+
+    def dump(self, path):
+        """
+        Write the stored frames to path as CSV.
+        """
+        with open(path, "w") as output:
+            output.write(",".join(("frame",) + PHASES) + "\n")
+            for frame, durations in self.records():
+                output.write("{},{}\n".format(
+                    frame, ",".join("{:.9f}".format(duration)
+                                    for duration in durations)))
+
+
+class Scheduler(object):
+    """
+    Fixed-timestep loop, game logic advances in ticks of 1 / tick_rate
+    seconds regardless of how long frames take to draw.
+
+    In realtime mode elapsed time is added to an accumulator and as many
+    ticks run as it holds, rendering happens at most render_rate times a
+    second and the loop sleeps while there is nothing to do.
+    Otherwise every frame runs exactly one tick without waiting, so
+    headless games run as fast as possible.
+    """
+
+    def __init__(self, tick, render=None, present=None, poll_input=None,
+                 tick_rate=60, render_rate=60, realtime=True,
+                 timings=None, max_frame_time=0.25, stats=None,
+                 wait_input=None):
+        """
+        tick, render, present and poll_input are called without arguments.
+        Any but tick may be None. max_frame_time bounds how much time a
+        single slow frame can add to the accumulator.
+        wait_input is called instead of sleeping with the seconds until
+        the next tick or render is due, and may return early when input
+        arrives.
+        stats is an optional tetris_stats.Stats counting frames and frames
+        overrunning their budget, the render interval when rendering and
+        the tick interval otherwise.
+        """
+        self.tick = tick
+        self.render = render
+        self.present = present
+        self.poll_input = poll_input
+        self.tick_interval = 1.0 / tick_rate
+        self.render_interval = 1.0 / render_rate if render_rate else 0.0
+        self.realtime = realtime
+        self.timings = timings if timings is not None else FrameTimings()
+        self.max_frame_time = max_frame_time
+        self.stats = stats
+        self.budget = self.render_interval or self.tick_interval
+        self.wait_input = wait_input
+
+        self.running = False
+        self.ticks = 0
+        self.accumulator = 0.0
+        self.previous = None
+        self.next_render = 0.0
+        # The time the running tick stands for, see frame().
+        self.tick_time = None
+
+    def stop(self):
+        """
+        End run() after the current frame.
+        """
+        self.running = False
+
+    def resync(self):
+        """
+        Forget time spent outside the loop, such as while paused.
+        """
+        self.previous = time.perf_counter()
+        self.accumulator = 0.0
+
+    def run(self, max_ticks=None):
+        """
+        Loop until stop() is called or max_ticks ticks have run.
+        """
+        self.running = True
+        self.resync()
+        while self.running and (max_ticks is None or
+                                self.ticks < max_ticks):
+            self.frame()
+        self.running = False
+
+    def frame(self):
+        """
+        Poll input, advance the logic, render and present one frame.
+
+        While a tick runs tick_time is the time it was due, except for the
+        last tick of the frame which stands for the time polling finished,
+        so a tick can take the input timestamped up to tick_time and every
+        input polled is taken by the end of the frame.
+        """
+        polled = time.perf_counter()
+        if self.poll_input is not None:
+            self.poll_input()
+        start = time.perf_counter()
+        if self.realtime:
+            self.accumulator += min(start - self.previous,
+                                    self.max_frame_time)
+        else:
+            self.accumulator = self.tick_interval
+        self.previous = start
+
+        self.tick_time = start - self.accumulator
+        while self.accumulator >= self.tick_interval and self.running:
+            self.tick_time += self.tick_interval
+            if self.accumulator < 2 * self.tick_interval:
+                self.tick_time = start
+            self.tick()
+            self.ticks += 1
+            self.accumulator -= self.tick_interval
+        logic_done = time.perf_counter()
+
+        render_done = present_done = logic_done
+        if self.render is not None and logic_done >= self.next_render:
+            self.next_render += self.render_interval
+            if self.next_render < logic_done:
+                self.next_render = logic_done + self.render_interval
+            self.render()
+            render_done = time.perf_counter()
+            if self.present is not None:
+                self.present()
+            present_done = time.perf_counter()
+
+        self.timings.record(start - polled,
+                            logic_done - start,
+                            render_done - logic_done,
+                            present_done - render_done)
+        if self.stats is not None:
+            self.stats.frames += 1
+            if present_done - polled > self.budget:
+                self.stats.frame_overruns += 1
+
+        if self.realtime and self.running:
+            self.wait()
+
+    def wait(self):
+        """
+        Sleep until the next tick or render is due.
+        """
+        now = time.perf_counter()
+        due = self.previous + self.tick_interval - self.accumulator
+        if self.render is not None:
+            due = min(due, self.next_render)
+        if due > now:
+            if self.wait_input is not None:
+                self.wait_input(due - now)
+            else:
+                time.sleep(due - now)
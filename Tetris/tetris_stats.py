@@ -0,0 +1,178 @@
+import array
+import http.server
+import json
+import os
+import threading
+import time
+
+# Counters kept by Stats, see Stats.__init__.
+COUNTERS = ("moves_attempted",
+            "moves_rejected",
+            "collision_checks",
+            "pieces_locked",
+            "lines_cleared",
+            "frames",
+            "frame_overruns")
+
+# Timed sections, draw and present together make up
+# tetris_interface.Interface.update_display.
+TIMERS = ("draw", "present")
+
+# Percentiles reported of sampled latencies.
+PERCENTILES = (50, 90, 99)
+
+
+class Timer(object):
+    """
+    Number of times a section ran and the total and longest seconds spent.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.longest = 0.0
+
+    def add(self, seconds):
+        """
+        Record one run of the section.
+        """
+        self.count += 1
+        self.total += seconds
+        if seconds > self.longest:
+            self.longest = seconds
+
+    def report(self):
+        """
+        The timer as a dict, times in milliseconds.
+        """
+        mean = self.total / self.count if self.count else 0.0
+        return {"count": self.count,
+                "total_ms": self.total * 1000,
+                "mean_ms": mean * 1000,
+                "max_ms": self.longest * 1000}
+
+
+class Samples(object):
+    """
+    Ring buffer of the most recent size samples of a latency in seconds,
+    reported as percentiles. Storage is allocated once up front.
+    """
+
+    def __init__(self, size=4096):
+        self.size = size
+        self.count = 0
+        self.data = array.array('d', bytes(8 * size))
+
+    def add(self, seconds):
+        """
+        Record one sample.
+        """
+        self.data[self.count % self.size] = seconds
+        self.count += 1
+
+    def report(self):
+        """
+        The count of samples and the nearest-rank PERCENTILES and maximum
+        of those stored, times in milliseconds.
+        """
+        stored = sorted(self.data[:min(self.count, self.size)])
+        report = {"count": self.count,
+                  "max_ms": stored[-1] * 1000 if stored else 0.0}
+        for percent in PERCENTILES:
+            rank = max(1, -(-len(stored) * percent // 100))
+            report["p{}_ms".format(percent)] = (stored[rank - 1] * 1000
+                                                if stored else 0.0)
+        return report
+
+
+class Stats(object):
+    """
+    Opt-in counters and timers for a running game.
+
+    Engine, Scheduler and Tetris_Game hold a stats attribute that is None
+    unless instrumentation is wanted, so when it is off the only cost is
+    checking it. Counters are plain attributes incremented in place.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # move_valid calls, and those that failed
+        self.moves_attempted = 0
+        self.moves_rejected = 0
+        # Board.collision_occured calls made by the engine
+        self.collision_checks = 0
+        # fix_tetro_position calls and the lines they removed
+        self.pieces_locked = 0
+        self.lines_cleared = 0
+        # Scheduler frames, and those taking longer than their budget
+        self.frames = 0
+        self.frame_overruns = 0
+        self.timers = {name: Timer() for name in TIMERS}
+        # Seconds from an input being read or repeating to the first frame
+        # showing it.
+        self.input_latency = Samples()
+        self.server = None
+
+    def time(self, name, seconds):
+        """
+        Add seconds spent in the section name.
+        """
+        self.timers[name].add(seconds)
+
+    def report(self):
+        """
+        Every counter and timer as a JSON serialisable dict.
+        """
+        report = {name: getattr(self, name) for name in COUNTERS}
+        report["elapsed_s"] = time.perf_counter() - self.started
+        report["timers"] = {name: timer.report()
+                            for name, timer in self.timers.items()}
+        report["input_latency"] = self.input_latency.report()
+        return report
+
+    def dump(self, path):
+        """
+        Write the report to path as JSON.
+        The file is replaced in one step, so readers polling it never see
+        a partial report.
+        """
+        partial = path + ".tmp"
+        with open(partial, "w") as output:
+            json.dump(self.report(), output, indent=2, sort_keys=True)
+            output.write("\n")
+        os.replace(partial, path)
+
+    def serve(self, port=0, host="127.0.0.1"):
+        """
+        Serve the report as JSON over HTTP from a background thread, on
+        localhost by default. A port of 0 picks a free port.
+        Returns the (host, port) served on.
+        """
+        stats = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(stats.report(), sort_keys=True).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  daemon=True)
+        thread.start()
+        return self.server.server_address
+
+    def close(self):
+        """
+        Stop serving the report.
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
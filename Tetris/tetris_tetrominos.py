@@ -1,3 +1,5 @@
+import collections
+
 SHAPES = ["Tetro_Line",
           "Tetro_T",
           "Tetro_J",
@@ -6,19 +8,210 @@ SHAPES = ["Tetro_Line",
           "Tetro_Z",
           "Tetro_O"]
 
+# The one-sided pentominos, mirrored shapes have names ending in R.
+PENTOMINOS = ["Pento_I",
+              "Pento_F",
+              "Pento_FR",
+              "Pento_L",
+              "Pento_LR",
+              "Pento_N",
+              "Pento_NR",
+              "Pento_P",
+              "Pento_PR",
+              "Pento_T",
+              "Pento_U",
+              "Pento_V",
+              "Pento_W",
+              "Pento_X",
+              "Pento_Y",
+              "Pento_YR",
+              "Pento_Z",
+              "Pento_ZR"]
+
+# Every piece, in the order used to number pieces in replays and
+# snapshots.
+NAMES = SHAPES + PENTOMINOS
+
+# Spawn shape, pivot_vector and image of each piece.
+# A pivot_vector of None means the piece never rotates.
+DEFINITIONS = {
+    "Tetro_Line": ([(0, 0), (0, 1), (0, 2), (0, 3)], (0, 1), 'blue'),
+    "Tetro_T": ([(0, 1), (1, 0), (1, 1), (1, 2)], (1, 1), 'pink'),
+    "Tetro_J": ([(0, 0), (1, 0), (1, 1), (1, 2)], (1, 1), 'orange'),
+    "Tetro_L": ([(0, 2), (1, 0), (1, 1), (1, 2)], (1, 1), 'red'),
+    "Tetro_S": ([(0, 1), (0, 2), (1, 0), (1, 1)], (1, 1), 'green'),
+    "Tetro_Z": ([(0, 0), (0, 1), (1, 1), (1, 2)], (1, 1), 'darkblue'),
+    "Tetro_O": ([(0, 0), (0, 1), (1, 0), (1, 1)], None, 'yellow'),
+    "Pento_I": ([(0, 0), (0, 1), (0, 2), (0, 3), (0, 4)], (0, 2), 'blue'),
+    "Pento_F": ([(0, 1), (0, 2), (1, 0), (1, 1), (2, 1)], (1, 1), 'green'),
+    "Pento_FR": ([(0, 0), (0, 1), (1, 1), (1, 2), (2, 1)], (1, 1),
+                 'darkblue'),
+    "Pento_L": ([(0, 0), (1, 0), (1, 1), (1, 2), (1, 3)], (1, 1), 'orange'),
+    "Pento_LR": ([(0, 3), (1, 0), (1, 1), (1, 2), (1, 3)], (1, 2), 'red'),
+    "Pento_N": ([(0, 0), (0, 1), (1, 1), (1, 2), (1, 3)], (1, 1), 'green'),
+    "Pento_NR": ([(0, 2), (0, 3), (1, 0), (1, 1), (1, 2)], (1, 2),
+                 'darkblue'),
+    "Pento_P": ([(0, 0), (0, 1), (1, 0), (1, 1), (2, 0)], (1, 0), 'yellow'),
+    "Pento_PR": ([(0, 0), (0, 1), (1, 0), (1, 1), (2, 1)], (1, 1), 'yellow'),
+    "Pento_T": ([(0, 0), (0, 1), (0, 2), (1, 1), (2, 1)], (1, 1), 'pink'),
+    "Pento_U": ([(0, 0), (0, 2), (1, 0), (1, 1), (1, 2)], (1, 1), 'pink'),
+    "Pento_V": ([(0, 0), (1, 0), (2, 0), (2, 1), (2, 2)], (1, 1), 'blue'),
+    "Pento_W": ([(0, 0), (1, 0), (1, 1), (2, 1), (2, 2)], (1, 1), 'orange'),
+    "Pento_X": ([(0, 1), (1, 0), (1, 1), (1, 2), (2, 1)], None, 'red'),
+    "Pento_Y": ([(0, 1), (1, 0), (1, 1), (1, 2), (1, 3)], (1, 1), 'orange'),
+    "Pento_YR": ([(0, 2), (1, 0), (1, 1), (1, 2), (1, 3)], (1, 2), 'red'),
+    "Pento_Z": ([(0, 0), (0, 1), (1, 1), (2, 1), (2, 2)], (1, 1), 'green'),
+    "Pento_ZR": ([(0, 1), (0, 2), (1, 1), (2, 0), (2, 1)], (1, 1),
+                 'darkblue')}
+
+# The pieces drawn from in each bag, by piece set name.
+PIECE_SETS = {'tetrominos': SHAPES,
+              'pentominos': PENTOMINOS}
+
+# blocks: (row, column) offsets of each block from the tetromino origin.
+# bounds: (min_row, min_col, max_row, max_col) over blocks.
+# row_masks: (row_offset, mask) in descending row order, bit n of mask
+#            is set for a block at column offset min_col + n.
+# bottom: (column_offset, row_offset) of the lowest block in each column.
+Shape = collections.namedtuple('Shape', ['blocks', 'bounds', 'row_masks',
+                                         'bottom'])
+
+
+def rotate_shape(shape, pivot_vector, rotation_matrix=((0, 1), (-1, 0))):
+    """
+    Rotate shape clockwise around pivot_vector.
+    """
+    def dot_product(rotation_matrix, relative_vector):
+        """
+        Calculates the matrix product between rotation_matrix and
+        relative_vector.
+        """
+        return tuple([sum(row[index]*relative_vector[index]
+                          for index in [0, 1]) for row in rotation_matrix])
+
+    new_shape = []
+    for block_vector in shape:
+
+        # Vector relative to pivot_vector origin
+        relative_vector = (block_vector[0] - pivot_vector[0],
+                           block_vector[1] - pivot_vector[1])
+
+        # rotate 90 degrees
+        transition_vector = dot_product(rotation_matrix, relative_vector)
+
+        # Vector back to (0,0) origin
+        new_block_vector = (
+            transition_vector[0] + pivot_vector[0],
+            transition_vector[1] + pivot_vector[1])
+        new_shape.append(new_block_vector)
+    return new_shape
+
+
+def build_shape(blocks):
+    """
+    Create the Shape table entry for a list of block offsets.
+    """
+    blocks = tuple(tuple(block) for block in blocks)
+    min_row = min(block[0] for block in blocks)
+    min_col = min(block[1] for block in blocks)
+    max_row = max(block[0] for block in blocks)
+    max_col = max(block[1] for block in blocks)
+
+    masks = {}
+    for block in blocks:
+        masks[block[0]] = masks.get(block[0], 0) | 1 << (block[1] - min_col)
+    row_masks = tuple(sorted(masks.items(), reverse=True))
+
+    lowest = {}
+    for row, col in blocks:
+        lowest[col] = max(lowest.get(col, row), row)
+    bottom = tuple(sorted(lowest.items()))
+
+    return Shape(blocks, (min_row, min_col, max_row, max_col), row_masks,
+                 bottom)
+
+
+def build_table(definitions):
+    """
+    Precompute every rotation state of each tetromino.
+    Returns the shape table keyed by (name, rotation) and the number of
+    rotation states of each tetromino.
+    """
+    table = {}
+    rotations = {}
+    for name, (shape, pivot_vector, image) in definitions.items():
+        count = 1 if pivot_vector is None else 4
+        for rotation in range(count):
+            table[(name, rotation)] = build_shape(shape)
+            if pivot_vector is not None:
+                shape = rotate_shape(shape, pivot_vector)
+        rotations[name] = count
+    return table, rotations
+
+
+SHAPE_TABLE, ROTATIONS = build_table(DEFINITIONS)
+
+
+def spawn_column(width):
+    """
+    Origin column pieces spawn at on a board width columns wide.
+    """
+    return width // 2 - 2
+
+
+def preview_size(names):
+    """
+    Rows and columns needed to show any of names in its spawn rotation.
+    """
+    bounds = [SHAPE_TABLE[(name, 0)].bounds for name in names]
+    return (max(bound[2] for bound in bounds) + 1,
+            max(bound[3] for bound in bounds) + 1)
+
 
 class _Tetromino(object):
     '''
     The base class for a Tetromino object
     This is a base class and should never be instantiated.
+
+    A tetromino only holds its rotation index and origin, the blocks it
+    occupies are looked up in SHAPE_TABLE.
     '''
 
-    def __init__(self):
+    def __init__(self, name=None):
         '''
         Initialise starting position.
+        name defaults to the name of the class.
         '''
+        self.name = name or type(self).__name__
+        self.image = DEFINITIONS[self.name][2]
+        self.rotations = ROTATIONS[self.name]
         self.position = [0, 3]
         self.temp_position = list(self.position)
+        self.rotation = 0
+        self.temp_rotation = 0
+
+    def table_entry(self, temp=True):
+        """
+        The SHAPE_TABLE entry for temp_rotation by default.
+        If temp is False use rotation.
+        """
+        if temp:
+            return SHAPE_TABLE[(self.name, self.temp_rotation)]
+        return SHAPE_TABLE[(self.name, self.rotation)]
+
+    @property
+    def shape(self):
+        """
+        Block offsets of the current rotation.
+        """
+        return SHAPE_TABLE[(self.name, self.rotation)].blocks
+
+    @property
+    def temp_shape(self):
+        """
+        Block offsets of the proposed rotation.
+        """
+        return SHAPE_TABLE[(self.name, self.temp_rotation)].blocks
 
     def absolute_position(self, temp=True):
         """
@@ -27,54 +220,25 @@ class _Tetromino(object):
         If temp is False use shape and position.
         """
         if temp:
-            position = self.temp_position
-            shape = self.temp_shape
+            row, col = self.temp_position
         else:
-            position = self.position
-            shape = self.shape
-        abs_pos = [[block_vector[index] + position[index]
-                    for index in [0, 1]]
-                   for block_vector in shape]
-        return abs_pos
+            row, col = self.position
+        return [(block[0] + row, block[1] + col)
+                for block in self.table_entry(temp).blocks]
 
     def rows_occupied(self):
         """
         Get non-repeating X co-ordinates of absolute_position in
         descending order.
         """
-        rows = {block[0] for block in self.absolute_position()}
-        rows = list(rows)
-        rows.sort(reverse=True)
-        return rows
+        row = self.temp_position[0]
+        return [row + row_mask[0] for row_mask in self.table_entry().row_masks]
 
-    def rotate(self, rotation_matrix=[(0, 1), (-1, 0)]):
+    def rotate(self):
         """
         Calculate temp_shape by rotating shape clockwise around pivot_vector.
         """
-        def dot_product(rotation_matrix, relative_vector):
-            """
-            Calculates the matrix product between rotation_matrix and
-            relative_vector.
-            """
-            return tuple([sum(row[index]*relative_vector[index]
-                              for index in [0, 1]) for row in rotation_matrix])
-
-        new_shape = []
-        for block_vector in self.shape:
-
-            # Vector relative to pivot_vector origin
-            relative_vector = (block_vector[0] - self.pivot_vector[0],
-                               block_vector[1] - self.pivot_vector[1])
-
-            # rotate 90 degrees
-            transition_vector = dot_product(rotation_matrix, relative_vector)
-
-            # Vector back to (0,0) origin
-            new_block_vector = (
-                transition_vector[0] + self.pivot_vector[0],
-                transition_vector[1] + self.pivot_vector[1])
-            new_shape.append(new_block_vector)
-        self.temp_shape = new_shape
+        self.temp_rotation = (self.rotation + 1) % self.rotations
 
     def move_l(self):
         """
@@ -98,15 +262,17 @@ class _Tetromino(object):
         """
         Make temp_position the new position.
         """
-        self.position = list(self.temp_position)
-        self.shape = list(self.temp_shape)
+        self.position[0] = self.temp_position[0]
+        self.position[1] = self.temp_position[1]
+        self.rotation = self.temp_rotation
 
     def clear_temp_position_shape(self):
         """
         Forget temp_position, make equal to position.
         """
-        self.temp_position = list(self.position)
-        self.temp_shape = list(self.shape)
+        self.temp_position[0] = self.position[0]
+        self.temp_position[1] = self.position[1]
+        self.temp_rotation = self.rotation
 
 
 class Tetro_Line(_Tetromino):
@@ -114,110 +280,63 @@ class Tetro_Line(_Tetromino):
     Line shaped Tetromino object.
     '''
 
-    def __init__(self):
-        super(Tetro_Line, self).__init__()
-        self.shape = [(0, 0), (0, 1), (0, 2), (0, 3)]
-        self.temp_shape = list(self.shape)
-        self.pivot_vector = (0, 1)
-        self.image = 'blue'
-
-    def rotate(self):
-        super(Tetro_Line, self).rotate()
-
 
 class Tetro_T(_Tetromino):
     '''
     T shaped Tetromino object.
     '''
 
-    def __init__(self):
-        super(Tetro_T, self).__init__()
-        self.shape = [(0, 1), (1, 0), (1, 1), (1, 2)]
-        self.temp_shape = list(self.shape)
-        self.pivot_vector = (1, 1)
-        self.image = 'pink'
-
-    def rotate(self):
-        super(Tetro_T, self).rotate()
-
 
 class Tetro_J(_Tetromino):
     '''
     J shaped Tetromino object.
     '''
 
-    def __init__(self):
-        super(Tetro_J, self).__init__()
-        self.shape = [(0, 0), (1, 0), (1, 1), (1, 2)]
-        self.temp_shape = list(self.shape)
-        self.pivot_vector = (1, 1)
-        self.image = 'orange'
-
-    def rotate(self):
-        super(Tetro_J, self).rotate()
-
 
 class Tetro_L(_Tetromino):
     '''
     L shaped Tetromino object.
     '''
 
-    def __init__(self):
-        super(Tetro_L, self).__init__()
-        self.shape = [(0, 2), (1, 0), (1, 1), (1, 2)]
-        self.temp_shape = list(self.shape)
-        self.pivot_vector = (1, 1)
-        self.image = 'red'
-
-    def rotate(self):
-        super(Tetro_L, self).rotate()
-
 
 class Tetro_S(_Tetromino):
     '''
     S shaped Tetromino object.
     '''
 
-    def __init__(self):
-        super(Tetro_S, self).__init__()
-        self.shape = [(0, 1), (0, 2), (1, 0), (1, 1)]
-        self.temp_shape = list(self.shape)
-        self.pivot_vector = (1, 1)
-        self.image = 'green'
-
-    def rotate(self):
-        super(Tetro_S, self).rotate()
-
 
 class Tetro_Z(_Tetromino):
     '''
     Z shaped Tetromino object.
     '''
 
-    def __init__(self):
-        super(Tetro_Z, self).__init__()
-        self.shape = [(0, 0), (0, 1), (1, 1), (1, 2)]
-        self.temp_shape = list(self.shape)
-        self.pivot_vector = (1, 1)
-        self.image = 'darkblue'
-
-    def rotate(self):
-        super(Tetro_Z, self).rotate()
-
 
 class Tetro_O(_Tetromino):
     '''
     O shaped Tetromino object.
     '''
 
-    def __init__(self):
-        super(Tetro_O, self).__init__()
-        self.shape = [(0, 0), (0, 1), (1, 0), (1, 1)]
-        self.temp_shape = list(self.shape)
-        self.image = 'yellow'
 
-    def rotate(self):
-        """
-        Overwrite superclass method to effectively do nothing.
-        """
-        return self.shape
+class Piece(_Tetromino):
+    '''
+    A piece of any shape in DEFINITIONS, named when created.
+    '''
+
+    def __init__(self, name):
+        super(Piece, self).__init__(name)
+
+
+CLASSES = {name: globals()[name] for name in SHAPES}
+
+
+def create(name, width=10):
+    """
+    A new piece of shape name at the spawn position of a board width
+    columns wide. The seven tetrominos keep their own classes.
+    """
+    if name in CLASSES:
+        piece = CLASSES[name]()
+    else:
+        piece = Piece(name)
+    piece.position[1] = piece.temp_position[1] = spawn_column(width)
+    return piece
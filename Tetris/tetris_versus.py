@@ -0,0 +1,475 @@
+import asyncio
+import random
+import sys
+import tetris_bitboard as bitboard
+import tetris_broadcast as broadcast
+import tetris_engine as engine
+
+# Garbage rows sent to the opponent per number of lines cleared at once.
+GARBAGE = {1: 0,
+           2: 1,
+           3: 2,
+           4: 4,
+           5: 5}
+
+# Server messages start with one of these, clients only send actions.
+#   START  the seat index of the player, 0 or 1
+#   FRAME  the seat index of the game then a tetris_broadcast frame body
+#   END    the seat index of the winner, DRAW if both lost together
+START = 0
+FRAME = 1
+END = 2
+DRAW = 255
+
+# Frames a client may fall behind by before it is sent keyframes instead.
+QUEUE_SIZE = broadcast.QUEUE_SIZE
+
+
+class Match(object):
+    """
+    Two games played side by side on the same piece sequence.
+
+    Clearing two or more lines at once sends garbage rows to the opponent.
+    Garbage waits until its receiver next locks a piece; lines cleared by
+    that piece cancel it first, otherwise it is pushed up from the bottom
+    of the board with one gap.
+    """
+
+    def __init__(self, seed=None, board_class=bitboard.Bitboard,
+                 variant=engine.STANDARD):
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        self.engines = [engine.Engine(board_class, seed, variant)
+                        for seat in range(2)]
+        self.random = random.Random(seed)
+        self.pending = [0, 0]
+        self.over = False
+        self.winner = None
+
+    def tick(self, actions=((), ())):
+        """
+        Advance both games by one logic tick, each with its own actions,
+        and settle any garbage. Returns the State of each game.
+        """
+        states = [game.tick(seat_actions)
+                  for game, seat_actions in zip(self.engines, actions)]
+        for seat, state in enumerate(states):
+            if state.locked:
+                self.locked(seat, state.lines_cleared)
+
+        lost = [seat for seat, game in enumerate(self.engines)
+                if game.game_over]
+        if lost:
+            self.over = True
+            if len(lost) == 1:
+                self.winner = 1 - lost[0]
+        return states
+
+    def locked(self, seat, lines):
+        """
+        Settle garbage after the game at seat locked a piece clearing lines.
+        """
+        if lines:
+            attack = GARBAGE[lines]
+            cancelled = min(attack, self.pending[seat])
+            self.pending[seat] -= cancelled
+            self.pending[1 - seat] += attack - cancelled
+        elif self.pending[seat]:
+            game = self.engines[seat]
+            game.add_garbage(self.pending[seat],
+                             self.random.randrange(game.board.WIDTH))
+            self.pending[seat] = 0
+
+    def forfeit(self, seat):
+        """
+        End the match as lost by seat.
+        """
+        self.over = True
+        self.winner = 1 - seat
+
+
+class Channel(object):
+    """
+    One end of an in-process connection carrying bytes messages.
+    """
+
+    def __init__(self):
+        self.inbox = asyncio.Queue()
+        self.peer = None
+        self.closed = False
+
+    def send(self, message):
+        """
+        Queue message for the other end, without waiting.
+        """
+        if not self.closed:
+            self.peer.inbox.put_nowait(message)
+
+    async def receive(self):
+        """
+        The next message, None once the connection is closed.
+        """
+        if self.closed:
+            return None
+        return await self.inbox.get()
+
+    def behind(self):
+        """
+        Whether the other end has more than QUEUE_SIZE messages waiting.
+        """
+        return self.peer.inbox.qsize() > QUEUE_SIZE
+
+    def close(self):
+        """
+        Close both ends.
+        """
+        if not self.closed:
+            self.closed = self.peer.closed = True
+            self.inbox.put_nowait(None)
+            self.peer.inbox.put_nowait(None)
+
+
+def pipe():
+    """
+    Both ends of a new in-process connection.
+    """
+    near = Channel()
+    far = Channel()
+    near.peer = far
+    far.peer = near
+    return near, far
+
+
+class StreamChannel(object):
+    """
+    A Channel over an asyncio stream, messages sent as tetris_broadcast
+    frames.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        writer.transport.set_write_buffer_limits(broadcast.WRITE_BUFFER)
+
+    def send(self, message):
+        """
+        Write message without waiting for it to be sent.
+        """
+        if not self.writer.is_closing():
+            self.writer.write(broadcast.frame(message))
+
+    async def receive(self):
+        """
+        The next message, None once the connection is closed.
+        """
+        try:
+            size, = broadcast.FRAME_SIZE.unpack(
+                await self.reader.readexactly(broadcast.FRAME_SIZE.size))
+            return await self.reader.readexactly(size)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+
+    def behind(self):
+        """
+        Whether more than WRITE_BUFFER bytes are waiting to be sent.
+        """
+        return (self.writer.transport.get_write_buffer_size() >
+                broadcast.WRITE_BUFFER)
+
+    def close(self):
+        """
+        Close the stream.
+        """
+        self.writer.close()
+
+
+class Seat(object):
+    """
+    A player connected to the server, and the match they are in.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.actions = []
+        self.table = None
+        self.index = None
+        # Set when frames were skipped, keyframes are sent next.
+        self.stale = True
+
+
+class Table(object):
+    """
+    A match being hosted, its seats and the encoders of its two games.
+    """
+
+    def __init__(self, match, seats):
+        self.match = match
+        self.seats = seats
+        self.encoders = [broadcast.FrameEncoder() for seat in seats]
+        for index, seat in enumerate(seats):
+            seat.table = self
+            seat.index = index
+
+
+class MatchServer(object):
+    """
+    Hosts any number of matches in one event loop.
+
+    Players are paired in the order they join. Every match is advanced by
+    a single timer task, tick_rate times a second, rather than one task
+    per match, so a tick costs only the game logic of each match and the
+    frames it produces. Actions received between ticks are applied on the
+    next one. Sending never waits, a player whose channel falls behind
+    skips frames and is sent keyframes once it catches up.
+    """
+
+    def __init__(self, seed=None, tick_rate=60,
+                 board_class=bitboard.Bitboard, variant=engine.STANDARD):
+        self.random = random.Random(seed)
+        self.tick_interval = 1.0 / tick_rate
+        self.board_class = board_class
+        self.variant = variant
+        self.tables = []
+        self.waiting = None
+        self.ticks = 0
+        self.overruns = 0
+
+    async def join(self, channel):
+        """
+        Seat a player on channel and read their actions until they
+        disconnect. Messages are tetris_engine.ACTIONS indices.
+        """
+        seat = Seat(channel)
+        if self.waiting is None:
+            self.waiting = seat
+        else:
+            self.open_table([self.waiting, seat])
+            self.waiting = None
+
+        actions = engine.ACTIONS
+        try:
+            while True:
+                message = await channel.receive()
+                if message is None:
+                    break
+                seat.actions.extend(actions[index] for index in message
+                                    if index < len(actions))
+        finally:
+            if self.waiting is seat:
+                self.waiting = None
+            if seat.table is not None and not seat.table.match.over:
+                seat.table.match.forfeit(seat.index)
+            channel.close()
+
+    async def serve_stream(self, reader, writer):
+        """
+        asyncio.start_server callback seating a player on a stream.
+        """
+        await self.join(StreamChannel(reader, writer))
+
+    def open_table(self, seats):
+        """
+        Start a match between seats.
+        """
+        match = Match(self.random.randrange(1 << 32), self.board_class,
+                      self.variant)
+        table = Table(match, seats)
+        for seat in seats:
+            seat.channel.send(bytes([START, seat.index]))
+        self.tables.append(table)
+
+    def tick(self):
+        """
+        Advance every match by one tick and send the changes.
+        """
+        ended = []
+        for table in self.tables:
+            match = table.match
+            if not match.over:
+                seats = table.seats
+                match.tick([seat.actions for seat in seats])
+                for seat in seats:
+                    seat.actions = []
+            self.send_frames(table)
+            if match.over:
+                ended.append(table)
+
+        for table in ended:
+            self.tables.remove(table)
+            winner = table.match.winner
+            for seat in table.seats:
+                seat.channel.send(bytes([END, DRAW if winner is None
+                                         else winner]))
+                seat.table = None
+        self.ticks += 1
+
+    def send_frames(self, table):
+        """
+        Send each seat the frames of both games changed since the last
+        tick, or keyframes of both if it missed any.
+        """
+        deltas = [encoder.update(game) for encoder, game
+                  in zip(table.encoders, table.match.engines)]
+        for seat in table.seats:
+            channel = seat.channel
+            if channel.behind():
+                seat.stale = True
+            elif seat.stale:
+                seat.stale = False
+                for index, encoder in enumerate(table.encoders):
+                    channel.send(bytes([FRAME, index]) + encoder.keyframe())
+            else:
+                for index, delta in enumerate(deltas):
+                    if delta is not None:
+                        channel.send(bytes([FRAME, index]) + delta)
+
+    async def run(self):
+        """
+        Tick every match on a fixed timestep until cancelled.
+        A late tick is counted as an overrun and the timestep restarts
+        from it rather than running ticks back to back to catch up.
+        """
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        while True:
+            self.tick()
+            due += self.tick_interval
+            delay = due - loop.time()
+            if delay < 0:
+                self.overruns += 1
+                due = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+
+class Client(object):
+    """
+    A player's view of a match, both games rebuilt from the server's
+    frames.
+    """
+
+    def __init__(self):
+        self.viewers = [broadcast.Viewer(), broadcast.Viewer()]
+        self.index = None
+        self.over = False
+        self.winner = None
+
+    def handle(self, message):
+        """
+        Apply one server message.
+        """
+        kind = message[0]
+        if kind == START:
+            self.index = message[1]
+            self.viewers = [broadcast.Viewer(), broadcast.Viewer()]
+            self.over = False
+            self.winner = None
+        elif kind == FRAME:
+            self.viewers[message[1]].apply(message[2:])
+        elif kind == END:
+            self.over = True
+            self.winner = None if message[1] == DRAW else message[1]
+
+    async def receive(self, channel):
+        """
+        Apply messages from channel until the match ends or the connection
+        closes.
+        """
+        while not self.over:
+            message = await channel.receive()
+            if message is None:
+                break
+            self.handle(message)
+
+    def send(self, channel, actions):
+        """
+        Send actions, tetris_engine.ACTIONS names, to the server.
+        """
+        if actions:
+            channel.send(bytes(engine.ACTIONS.index(action)
+                               for action in actions))
+
+
+async def play(channel, frame_rate=60):
+    """
+    Play a match with the keyboard, the player's own game drawn by
+    tetris_interface.Interface and the opponent's shown in the caption.
+    """
+    import pygame
+    import tetris_interface as interface
+    import tetris_player as player_module
+    import tetris_tetrominos as tetro
+
+    interface.init()
+    player = player_module.Player()
+    player.bind(None)
+    client = Client()
+    receiving = asyncio.ensure_future(client.receive(channel))
+    display = None
+    drawn = 0
+    pygame.display.set_caption("Waiting for an opponent")
+    while not receiving.done():
+        inputs = player.get_input()
+        if 'quit' in inputs:
+            break
+        client.send(channel, [input for input in inputs
+                              if input in engine.ACTIONS])
+
+        if client.index is not None:
+            own = client.viewers[client.index]
+            other = client.viewers[1 - client.index]
+            if own.frames != drawn and own.board is not None:
+                drawn = own.frames
+                board = own.board
+                if display is None:
+                    display = interface.Interface(
+                        board.WIDTH, board.HEIGHT - 1 - board.HIDDEN_ROWS,
+                        tetro.preview_size(own.shapes))
+                display.update_display(board, own.tetro_current,
+                                       own.tetro_next, own, own.lines)
+                pygame.display.set_caption(
+                    "Opponent score {} lines {}".format(other.score,
+                                                        other.lines))
+        await asyncio.sleep(1.0 / frame_rate)
+
+    if client.over and display is not None:
+        display.display_game_over()
+        pygame.display.set_caption("You win" if client.winner == client.index
+                                   else "You lose")
+        while 'quit' not in player.get_input():
+            await asyncio.sleep(0.25)
+    receiving.cancel()
+    channel.close()
+
+
+async def serve(host, port):
+    """
+    Run a MatchServer for players connecting over TCP.
+    """
+    server = MatchServer()
+    listener = await asyncio.start_server(server.serve_stream, host, port)
+    address = listener.sockets[0].getsockname()[:2]
+    sys.stderr.write("serving matches on {}:{}\n".format(*address))
+    async with listener:
+        await server.run()
+
+
+async def connect(host, port):
+    """
+    Play a match against whoever else connects to a server.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    await play(StreamChannel(reader, writer))
+
+
+if __name__ == "__main__":
+    host = "127.0.0.1"
+    port = int(sys.argv[-1])
+    if len(sys.argv) > 3:
+        host = sys.argv[2]
+    if sys.argv[1] == "serve":
+        asyncio.run(serve(host, port))
+    else:
+        asyncio.run(connect(host, port))
+        import pygame
+        pygame.quit()
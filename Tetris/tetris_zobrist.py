@@ -0,0 +1,50 @@
+import zlib
+
+# Zobrist keys are derived with splitmix64 rather than drawn from a stored
+# random table, so every process and machine agrees on them and only the
+# keys actually used are ever computed.
+MASK = (1 << 64) - 1
+ROW_SALT = 0x243f6a8885a308d3
+PIECE_SALT = 0x13198a2e03707344
+
+ROW_KEYS = {}
+PIECE_KEYS = {}
+
+
+def splitmix64(value):
+    """
+    Mix value into a well distributed 64 bit integer.
+    """
+    value = (value + 0x9e3779b97f4a7c15) & MASK
+    value = ((value ^ (value >> 30)) * 0xbf58476d1ce4e5b9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94d049bb133111eb) & MASK
+    return value ^ (value >> 31)
+
+
+def row_key(height, mask):
+    """
+    Key of a row holding mask, height rows above the bottom row.
+    Empty rows have a key of 0 so they never need hashing.
+    """
+    if not mask:
+        return 0
+    index = (height, mask)
+    key = ROW_KEYS.get(index)
+    if key is None:
+        key = splitmix64(splitmix64(ROW_SALT ^ height) ^ mask)
+        ROW_KEYS[index] = key
+    return key
+
+
+def piece_key(name, rotation, row, col):
+    """
+    Key of tetromino name in rotation with its origin at row, col.
+    """
+    index = (name, rotation, row, col)
+    key = PIECE_KEYS.get(index)
+    if key is None:
+        key = splitmix64(PIECE_SALT ^ zlib.crc32(name.encode()))
+        key = splitmix64(key ^ (rotation << 32 | (row & 0xffff) << 16 |
+                                (col & 0xffff)))
+        PIECE_KEYS[index] = key
+    return key